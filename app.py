@@ -4,67 +4,109 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
+from database import RoutingSession, engine_options, configure_engines, REPLICA_BIND
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (DEBUG logs every request and is slow; opt in with LOG_LEVEL=DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+@login_manager.user_loader
+def load_user(user_id):
+    # Served from the identity cache; falls back to a primary key lookup
+    from identity import load_identity
+    return load_identity(int(user_id))
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///skillswap.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+def create_app(test_config=None):
+    # Building the app touches no database; run `flask init-db` once to
+    # create the schema and the admin account
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
-# Configure file uploads
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///skillswap.db")
+    # Pool sizing from DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config['SQLITE_WAL'] = os.environ.get("SQLITE_WAL", "1") == "1"
+    # Optional read replica for @replica_reads views
+    if os.environ.get("DATABASE_REPLICA_URL"):
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: os.environ["DATABASE_REPLICA_URL"]}
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
 
-# Initialize extensions
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'auth'
-login_manager.login_message = ''
+    # Configure file uploads
+    app.config['UPLOAD_FOLDER'] = 'static/uploads'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['IMAGE_WORKERS'] = int(os.environ.get("IMAGE_WORKERS", 2))  # background resize threads
 
-@login_manager.user_loader
-def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    # Notification push: 'memory', 'local[:dir]' (shared across workers on one host) or a redis:// URL
+    app.config['NOTIFICATION_BROKER'] = os.environ.get("NOTIFICATION_BROKER", "memory")
+    app.config['NOTIFICATION_STREAM_LIFETIME'] = int(os.environ.get("NOTIFICATION_STREAM_LIFETIME", 300))
+    # Pages open a stream per tab; each pins a sync worker, so only enable with
+    # gthread/gevent workers (the ASGI entry point enables it); otherwise pages poll
+    app.config['NOTIFICATION_PUSH'] = os.environ.get("NOTIFICATION_PUSH", "0") == "1"
+    # ASGI entry point (asgi.py): threads running Flask requests per process;
+    # keep within DB_POOL_SIZE + DB_MAX_OVERFLOW
+    app.config['ASGI_THREADS'] = int(os.environ.get("ASGI_THREADS", 10))
+
+    # Caching: 'memory' (per process) or 'local[:/path.db]' (shared by workers on one host)
+    # A *_CACHE_TTL of 0 turns that cache off
+    app.config['CACHE_BACKEND'] = os.environ.get("CACHE_BACKEND", "memory")
+    app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+    app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get("IDENTITY_CACHE_TTL", 60))
+    app.config['ADMIN_STATS_TTL'] = int(os.environ.get("ADMIN_STATS_TTL", 30))
+    app.config['MATCH_INDEX_TTL'] = int(os.environ.get("MATCH_INDEX_TTL", 300))
+    app.config['MESSAGE_FEED_TTL'] = int(os.environ.get("MESSAGE_FEED_TTL", 300))
+    app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get("FRAGMENT_CACHE_TTL", 3600))
 
-# Import routes after app initialization
-from routes import *
+    # Request profiling (per process): latency, SQL and template timings shown on /admin/perf
+    app.config['PERF_ENABLED'] = os.environ.get("PERF_ENABLED", "1") == "1"
+    app.config['PERF_BUFFER_SIZE'] = int(os.environ.get("PERF_BUFFER_SIZE", 2000))
+    app.config['PERF_PROFILE_SAMPLE_RATE'] = float(os.environ.get("PERF_PROFILE_SAMPLE_RATE", 0))  # 0..1, cProfile
+    app.config['PERF_SLOW_THRESHOLD'] = float(os.environ.get("PERF_SLOW_THRESHOLD", 0.5))  # seconds
+    app.config['PERF_METRICS_TOKEN'] = os.environ.get("PERF_METRICS_TOKEN")  # bearer token for scrapers
 
-with app.app_context():
-    # Import models to ensure tables are created
-    import models
-    db.create_all()
+    # Background jobs: 'thread' (runner inside each web process) or 'external' (`flask run-worker`)
+    app.config['JOB_RUNNER'] = os.environ.get("JOB_RUNNER", "thread")
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+    app.config['JOB_RETRY_DELAY'] = int(os.environ.get("JOB_RETRY_DELAY", 10))  # seconds, doubled per attempt
+    app.config['JOB_LOCK_TIMEOUT'] = int(os.environ.get("JOB_LOCK_TIMEOUT", 600))
+    app.config['JOB_POLL_INTERVAL'] = float(os.environ.get("JOB_POLL_INTERVAL", 5))
+    app.config['JOB_BATCH_SIZE'] = int(os.environ.get("JOB_BATCH_SIZE", 500))
     
-    # Create admin user if doesn't exist
-    from models import User
-    from werkzeug.security import generate_password_hash
-    admin = User.query.filter_by(email='admin@skillswap.com').first()
-    if not admin:
-        admin = User(
-            first_name='Admin',
-            last_name='User',
-            email='admin@skillswap.com',
-            password_hash=generate_password_hash('admin123'),
-            is_admin=True,
-            location='System'
-        )
-        db.session.add(admin)
-        db.session.commit()
+    # Finished swaps older than this move to swap_request_archive
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+
+    if test_config:
+        app.config.update(test_config)
+
+    # Initialize extensions
+    db.init_app(app)
+    with app.app_context():
+        configure_engines(db.engines.values(), wal=app.config['SQLITE_WAL'])
+    login_manager.init_app(app)
+    login_manager.login_view = 'main.auth'
+    login_manager.login_message = ''
+
+    # Wraps ProxyFix so the timings cover the whole request
+    if app.config['PERF_ENABLED']:
+        from perf import init_perf
+        init_perf(app)
+
+    # Routes and commands are imported here, not at module import time
+    from routes import bp
+    app.register_blueprint(bp)
+    from commands import register_commands
+    register_commands(app)
+
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Import by module name so models and this app share one `db`
+    from app import create_app
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
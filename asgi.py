@@ -0,0 +1,211 @@
+import asyncio
+import io
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask_login import current_user
+from notifications import get_broker, async_event_stream
+
+# ASGI entry point, an alternative to running the app under sync workers:
+#
+#   uvicorn --factory asgi:create_asgi_app --workers 4
+#
+# The notification stream is served on the event loop, so an open stream
+# costs a coroutine rather than a worker. Every other request (the rest of
+# /api/*, uploads, pages) runs the unchanged Flask app on a bounded pool of
+# ASGI_THREADS threads. Request bodies are received on the loop before a
+# thread is taken, so a slow upload holds no thread while it trickles in,
+# and a client that disconnects stops a streaming response at the next chunk.
+STREAM_PATH = '/api/notifications/stream'
+SPOOL_SIZE = 1024 * 1024  # request bodies larger than this are spooled to disk
+
+class AsgiApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(flask_app.config['ASGI_THREADS'], thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            if scope['path'] == STREAM_PATH and scope['method'] == 'GET':
+                identity = await self._in_thread(self._authenticate, self._environ(scope, io.BytesIO()))
+                if identity:
+                    await self._stream(identity, receive, send)
+                    return
+            # Anonymous stream requests get the usual login redirect
+            await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _in_thread(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _environ(self, scope, body):
+        root_path = scope.get('root_path', '')
+        path = scope['path']
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': root_path.encode().decode('latin1'),
+            'PATH_INFO': path.encode().decode('latin1'),
+            'QUERY_STRING': scope['query_string'].decode('latin1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin1').upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            value = value.decode('latin1')
+            if name in environ:
+                value = environ[name] + ('; ' if name == 'HTTP_COOKIE' else ',') + value
+            environ[name] = value
+        return environ
+
+    def _authenticate(self, environ):
+        # (user id, unread count) for a logged-in member, else None; the
+        # request context releases the DB session before streaming starts
+        with self.flask_app.request_context(environ):
+            if not current_user.is_authenticated:
+                return None
+            return current_user.id, current_user.unread_notifications or 0
+
+    async def _stream(self, identity, receive, send):
+        user_id, unread_count = identity
+        with self.flask_app.app_context():
+            broker = get_broker()
+            lifetime = self.flask_app.config['NOTIFICATION_STREAM_LIFETIME']
+
+        async def pump():
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            async for event in async_event_stream(broker, user_id, unread_count, lifetime=lifetime):
+                await send({'type': 'http.response.body', 'body': event.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        # Whichever ends first cancels the other; cancelling the pump
+        # unsubscribes from the broker
+        tasks = {asyncio.ensure_future(pump()), asyncio.ensure_future(self._disconnected(receive))}
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()
+
+    async def _disconnected(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def _read_body(self, receive, send):
+        # The whole body, or None if the client went away or sent too much
+        limit = self.flask_app.config.get('MAX_CONTENT_LENGTH')
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit and size > limit:
+                body.close()
+                await send({'type': 'http.response.start', 'status': 413,
+                            'headers': [(b'content-type', b'text/plain'), (b'connection', b'close')]})
+                await send({'type': 'http.response.body', 'body': b'Request Entity Too Large'})
+                return None
+            body.write(chunk)
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        return body
+
+    async def _wsgi(self, scope, receive, send):
+        body = await self._read_body(receive, send)
+        if body is None:
+            return
+        disconnected = threading.Event()
+
+        async def watch():
+            await self._disconnected(receive)
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await self._in_thread(self._run_wsgi, self._environ(scope, body), send,
+                                  asyncio.get_running_loop(), disconnected)
+        finally:
+            watcher.cancel()
+            body.close()
+
+    def _run_wsgi(self, environ, send, loop, disconnected):
+        # On a pool thread: run the Flask app and hand each chunk to the loop
+        response = {'start': None, 'sent': False}
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def write(data):
+            if not response['sent']:
+                emit(response['start'])
+                response['sent'] = True
+            emit({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response['sent']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+            }
+            return write
+
+        result = self.flask_app(environ, start_response)
+        try:
+            for chunk in result:
+                if disconnected.is_set():
+                    return
+                if chunk:
+                    write(chunk)
+            if not response['sent']:
+                emit(response['start'])
+            emit({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+def create_asgi_app(flask_app=None):
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    # Open streams cost nothing here, so pages use push instead of polling
+    flask_app.config['NOTIFICATION_PUSH'] = True
+    return AsgiApp(flask_app)
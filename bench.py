@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import json
+import platform
+import statistics
+import time
+from sqlalchemy import event, func, select
+from app import db
+from models import User, Skill, SwapRequest, Feedback
+
+# Route benchmarks through the Flask test client. Each route is warmed up
+# once, then requested `iterations` times while timing the call and counting
+# SQL statements. Results are written as a JSON baseline; a later run is
+# checked against it and fails when a route issues more queries than the
+# baseline or its median grows past the tolerance (tails are recorded but
+# too noisy on shared machines to gate on).
+
+def bench_routes(member_id, admin_id, search_term):
+    # (name, user to log in as, path)
+    return [
+        ('browse', member_id, '/browse'),
+        ('browse search', member_id, f'/browse?search_query={search_term}'),
+        ('dashboard', member_id, '/dashboard'),
+        ('profile', member_id, '/profile'),
+        ('api completed swaps', member_id, '/api/completed-swaps'),
+        ('api active swaps', member_id, '/api/active-swaps'),
+        ('api pending requests', member_id, '/api/pending-requests'),
+        ('admin', admin_id, '/admin'),
+        ('admin requests', admin_id, '/admin/requests'),
+    ]
+
+def _busiest_member():
+    # The member with the most swaps makes the per-user pages do real work
+    busiest = db.session.execute(
+        select(SwapRequest.requester_id).group_by(SwapRequest.requester_id)
+        .order_by(func.count().desc()).limit(1)
+    ).scalar()
+    return busiest or db.session.query(User.id).filter_by(is_admin=False).order_by(User.id).limit(1).scalar()
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run_benchmarks(app, iterations=50):
+    # `flask bench` runs inside an app context, which test client requests
+    # would reuse (sharing g, and the logged-in user, across requests)
+    return contextvars.Context().run(_run_benchmarks, app, iterations)
+
+def _run_benchmarks(app, iterations):
+    with app.app_context():
+        member_id = _busiest_member()
+        admin_id = db.session.query(User.id).filter_by(is_admin=True).order_by(User.id).limit(1).scalar()
+        search_term = db.session.query(Skill.name).order_by(Skill.id).limit(1).scalar() or 'python'
+        dataset = {
+            'users': db.session.query(func.count(User.id)).scalar(),
+            'skills': db.session.query(func.count(Skill.id)).scalar(),
+            'swap_requests': db.session.query(func.count(SwapRequest.id)).scalar(),
+            'feedback': db.session.query(func.count(Feedback.id)).scalar(),
+        }
+        engine = db.engine
+    if member_id is None or admin_id is None:
+        raise RuntimeError('Need at least one member and one admin; run `flask seed-db` first')
+
+    queries = []
+    def count_query(*args):
+        queries.append(1)
+
+    results = {}
+    event.listen(engine, 'before_cursor_execute', count_query)
+    try:
+        for name, user_id, path in bench_routes(member_id, admin_id, search_term.split()[0]):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+            client.get(path)  # warm up caches and connections
+
+            timings, counts, status = [], [], None
+            for _ in range(iterations):
+                queries.clear()
+                started = time.perf_counter()
+                response = client.get(path)
+                timings.append(time.perf_counter() - started)
+                counts.append(len(queries))
+                status = response.status_code
+            timings.sort()
+            results[name] = {
+                'path': path,
+                'status': status,
+                'p50_ms': round(_percentile(timings, 50) * 1000, 3),
+                'p95_ms': round(_percentile(timings, 95) * 1000, 3),
+                'p99_ms': round(_percentile(timings, 99) * 1000, 3),
+                'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+                'queries': max(counts),
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+
+    return {
+        'meta': {
+            'iterations': iterations,
+            'dataset': dataset,
+            'database': engine.dialect.name,
+            'python': platform.python_version(),
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'routes': results,
+    }
+
+def compare(current, baseline, tolerance=1.25, slack_ms=2.0):
+    # Returns a list of regression messages; empty means the check passed
+    problems = []
+    for name, before in baseline['routes'].items():
+        after = current['routes'].get(name)
+        if after is None:
+            problems.append(f'{name}: missing from this run')
+            continue
+        if after['status'] != before['status']:
+            problems.append(f"{name}: status {before['status']} -> {after['status']}")
+        if after['queries'] > before['queries']:
+            problems.append(f"{name}: {before['queries']} -> {after['queries']} queries")
+        limit = before['p50_ms'] * tolerance + slack_ms
+        if after['p50_ms'] > limit:
+            problems.append(f"{name}: p50 {before['p50_ms']:.1f}ms -> {after['p50_ms']:.1f}ms "
+                            f"(limit {limit:.1f}ms)")
+    return problems
+
+# Connection capacity of a running server (`flask bench-connections`). Opens
+# `connections` notification streams at once, counts how many deliver their
+# first event within `timeout`, and while they are held open times plain
+# /api/notifications requests. Sync workers serve one stream per worker and
+# queue the rest; the ASGI entry point (asgi.py) should hold them all and
+# keep answering. Point it at each server in turn on the same machine.
+STREAM_PATH = '/api/notifications/stream'
+PROBE_PATH = '/api/notifications'
+
+def _request(path, host, cookie, close=False):
+    return (f'GET {path} HTTP/1.1\r\nHost: {host}\r\nCookie: {cookie}\r\n'
+            f'Connection: {"close" if close else "keep-alive"}\r\n\r\n').encode()
+
+async def _open_stream(host, port, cookie, timeout):
+    # Returns (seconds to first event or None, writer to close later)
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(_request(STREAM_PATH, host, cookie))
+        received = b''
+        deadline = started + timeout
+        while b'data:' not in received:
+            chunk = await asyncio.wait_for(reader.read(4096), max(0.001, deadline - time.perf_counter()))
+            if not chunk or not received and not chunk.startswith(b'HTTP/1.1 200'):
+                return None, writer
+            received += chunk
+        return time.perf_counter() - started, writer
+    except (OSError, asyncio.TimeoutError):
+        return None, writer
+
+async def _probe(host, port, cookie, timeout):
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(_request(PROBE_PATH, host, cookie, close=True))
+        response = await asyncio.wait_for(reader.read(), timeout)
+        return time.perf_counter() - started if response.startswith(b'HTTP/1.1 200') else None
+    except (OSError, asyncio.TimeoutError):
+        return None
+    finally:
+        if writer:
+            writer.close()
+
+async def _connection_capacity(host, port, cookie, connections, probes, timeout):
+    streams = await asyncio.gather(*(_open_stream(host, port, cookie, timeout) for _ in range(connections)))
+    probe_times = [await _probe(host, port, cookie, timeout) for _ in range(probes)]
+    for _, writer in streams:
+        if writer:
+            writer.close()
+    served = sorted(seconds for seconds, _ in streams if seconds is not None)
+    answered = sorted(seconds for seconds in probe_times if seconds is not None)
+    return {
+        'connections': connections,
+        'streams_served': len(served),
+        'first_event_p50_ms': round(_percentile(served, 50) * 1000, 1) if served else None,
+        'first_event_p95_ms': round(_percentile(served, 95) * 1000, 1) if served else None,
+        'probes': probes,
+        'probes_answered': len(answered),
+        'probe_p50_ms': round(_percentile(answered, 50) * 1000, 1) if answered else None,
+        'probe_p95_ms': round(_percentile(answered, 95) * 1000, 1) if answered else None,
+    }
+
+def connection_capacity(host, port, cookie, connections=200, probes=20, timeout=5.0):
+    return asyncio.run(_connection_capacity(host, port, cookie, connections, probes, timeout))
+
+def member_cookie(app):
+    # A signed session for the busiest member; the server must share SESSION_SECRET
+    with app.app_context():
+        user_id = _busiest_member()
+    value = app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(user_id), '_fresh': True})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,72 @@
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy import event, update, select, func
+from sqlalchemy.orm import Session
+from app import db
+from cache import get_cache
+from models import User, AdminMessage
+from identity import mark_identity_stale
+from pagination import keyset_page
+
+# Platform message feed. A broadcast is one AdminMessage row; each member
+# only stores the newest message id they have seen (last_seen_message_id),
+# so sending never writes per-user rows. The newest id is cached, which
+# makes "anything unread?" a cache lookup for members who are caught up,
+# and rendered feed pages are cached under that id since every member sees
+# the same feed.
+LATEST_KEY = 'messages:latest'
+UNREAD_CAP = 99
+
+def latest_message_id():
+    cache = get_cache('messages')
+    latest = cache.get(LATEST_KEY)
+    if latest is None:
+        latest = db.session.query(func.max(AdminMessage.id)).scalar() or 0
+        cache.set(LATEST_KEY, latest, ttl=current_app.config['MESSAGE_FEED_TTL'])
+    return latest
+
+def unread_message_count(user):
+    # No query when caught up; otherwise a primary key range count, capped
+    seen = user.last_seen_message_id or 0
+    if seen >= latest_message_id():
+        return 0
+    unread = select(AdminMessage.id).where(AdminMessage.id > seen).limit(UNREAD_CAP + 1).subquery()
+    return db.session.execute(select(func.count()).select_from(unread)).scalar()
+
+def mark_messages_seen(user, message_id):
+    # Moves the watermark forward only; returns True if it moved
+    moved = db.session.execute(
+        update(User).where(User.id == user.id, User.last_seen_message_id < message_id)
+        .values(last_seen_message_id=message_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if moved:
+        mark_identity_stale(db.session(), user.id)
+    return bool(moved)
+
+def feed_page(cursor=None, limit=20):
+    # Returns (html, next_cursor) for one page of the feed
+    cache = get_cache('messages')
+    key = f'feed:{latest_message_id()}:{limit}:{cursor or ""}'
+    page = cache.get(key)
+    if page is None:
+        messages, next_cursor = keyset_page(AdminMessage.query, AdminMessage.created_at, AdminMessage.id,
+                                            cursor=cursor, limit=limit)
+        page = (render_template('message_feed.html', admin_messages=messages), next_cursor)
+        cache.set(key, page, ttl=current_app.config['MESSAGE_FEED_TTL'])
+    return Markup(page[0]), page[1]
+
+@event.listens_for(Session, 'before_flush')
+def _collect_new_messages(session, flush_context, instances):
+    if any(isinstance(obj, AdminMessage) for obj in session.new):
+        session.info['messages_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_latest(session):
+    # A new latest id also retires every cached feed page
+    if session.info.pop('messages_changed', False):
+        get_cache('messages').delete(LATEST_KEY)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_message_changes(session):
+    session.info.pop('messages_changed', None)
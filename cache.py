@@ -0,0 +1,137 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+# Small key/value cache with TTL and LRU eviction. The backend is chosen by
+# CACHE_BACKEND:
+#   memory             - per-process (default)
+#   local[:/path.db]   - SQLite file shared by every worker on this host
+
+class MemoryCache:
+    def __init__(self, max_entries=10000, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        # ttl=None means default_ttl; a ttl of 0 or less stores nothing
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            self.delete(key)
+            return
+        expires = time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteCache:
+    def __init__(self, path, max_entries=10000, default_ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed)')
+
+    def _connect(self):
+        # One connection per thread per process; never shared across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return None
+        conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            self.delete(key)
+            return
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value), now + ttl, now)
+        )
+        # Trim least recently used entries once we are over the bound
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    def delete(self, *keys):
+        if keys:
+            conn = self._connect()
+            conn.executemany('DELETE FROM cache WHERE key = ?', [(key,) for key in keys])
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+
+def create_cache(spec, max_entries=10000, default_ttl=300):
+    if spec.startswith('local'):
+        _, _, path = spec.partition(':')
+        return SQLiteCache(path or '/tmp/skillswap-cache.db', max_entries, default_ttl)
+    return MemoryCache(max_entries, default_ttl)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(name='default'):
+    # Named caches share a backend type but have separate storage and bounds
+    with _caches_lock:
+        if name not in _caches:
+            spec = current_app.config['CACHE_BACKEND']
+            if spec.startswith('local'):
+                _, _, path = spec.partition(':')
+                base, ext = os.path.splitext(path or '/tmp/skillswap-cache.db')
+                spec = f'local:{base}-{name}{ext or ".db"}'
+            _caches[name] = create_cache(spec, current_app.config['CACHE_MAX_ENTRIES'])
+    return _caches[name]
@@ -0,0 +1,246 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+
+@click.command('init-db')
+@with_appcontext
+def init_db():
+    """Create the schema, search index and admin account."""
+    import models
+    from migrations import upgrade
+    from search import init_search_index
+    from werkzeug.security import generate_password_hash
+    db.create_all()
+    
+    # Bring existing databases up to the current schema
+    for name in upgrade():
+        click.echo(f'Applied {name}')
+    
+    # Build the skill search index (FTS5 on SQLite, GIN on PostgreSQL)
+    if init_search_index() is None:
+        click.echo('Warning: no full-text index; skill search is degraded to substring matching')
+    
+    # Create admin user if doesn't exist
+    admin = models.User.query.filter_by(email='admin@skillswap.com').first()
+    if not admin:
+        admin = models.User(
+            first_name='Admin',
+            last_name='User',
+            email='admin@skillswap.com',
+            password_hash=generate_password_hash('admin123'),
+            is_admin=True,
+            location='System'
+        )
+        db.session.add(admin)
+        db.session.commit()
+        click.echo('Created admin@skillswap.com')
+    click.echo('Database is ready')
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db():
+    """Apply pending schema migrations."""
+    from migrations import upgrade
+    applied = upgrade()
+    if applied:
+        for name in applied:
+            click.echo(f'Applied {name}')
+    else:
+        click.echo('Schema is up to date')
+
+@click.command('seed-db')
+@with_appcontext
+@click.option('--users', default=1000, show_default=True)
+@click.option('--skills', default=3000, show_default=True, help='Skills offered.')
+@click.option('--wanted', default=3000, show_default=True, help='Skills wanted.')
+@click.option('--swaps', default=10000, show_default=True, help='Swap requests.')
+@click.option('--feedback', default=5000, show_default=True, help='Upper bound; only completed swaps get feedback.')
+@click.option('--seed', default=42, show_default=True, help='Random seed, for reproducible datasets.')
+@click.option('--batch-size', default=10000, show_default=True)
+def seed_db(users, skills, wanted, swaps, feedback, seed, batch_size):
+    """Bulk-insert a synthetic dataset for load testing."""
+    import time
+    from seeding import seed as seed_data, SEED_PASSWORD
+    from stats import invalidate_admin_stats
+    if users < 2:
+        raise click.BadParameter('need at least 2 users', param_hint='--users')
+    started = time.perf_counter()
+    seed_data(users=users, skills=skills, wanted=wanted, swaps=swaps, feedback=feedback,
+              seed=seed, batch_size=batch_size, progress=click.echo)
+    invalidate_admin_stats()
+    click.echo(f'Seeded in {time.perf_counter() - started:.1f}s; every seeded user has password {SEED_PASSWORD!r}')
+
+@click.command('bench')
+@with_appcontext
+@click.option('--iterations', default=50, show_default=True, help='Requests per route.')
+@click.option('--save', 'save_path', type=click.Path(dir_okay=False), help='Write results as the new baseline.')
+@click.option('--check', 'check_path', type=click.Path(exists=True, dir_okay=False), help='Fail on regressions against this baseline.')
+@click.option('--tolerance', default=1.25, show_default=True, help='Allowed growth factor for median latency.')
+def bench(iterations, save_path, check_path, tolerance):
+    """Benchmark the hot routes: latency percentiles and query counts."""
+    from bench import run_benchmarks, compare, load, save
+    results = run_benchmarks(current_app._get_current_object(), iterations=iterations)
+    click.echo(f"{'route':<22} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, row in results['routes'].items():
+        click.echo(f"{name:<22} {row['status']:>6} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                   f"{row['p99_ms']:>8.1f} {row['queries']:>8}")
+    if save_path:
+        save(results, save_path)
+        click.echo(f'Saved baseline to {save_path}')
+    if check_path:
+        problems = compare(results, load(check_path), tolerance=tolerance)
+        for problem in problems:
+            click.echo(f'REGRESSION {problem}')
+        if problems:
+            raise SystemExit(1)
+        click.echo('No regressions')
+
+@click.command('bench-connections')
+@with_appcontext
+@click.option('--url', default='http://127.0.0.1:8000', show_default=True, help='Running server to measure.')
+@click.option('--connections', default=200, show_default=True, help='Notification streams to open at once.')
+@click.option('--probes', default=20, show_default=True, help='API requests timed while the streams are open.')
+@click.option('--timeout', default=5.0, show_default=True, help='Seconds to wait for a stream or probe.')
+@click.option('--save', 'save_path', type=click.Path(dir_okay=False), help='Write the results as JSON.')
+def bench_connections(url, connections, probes, timeout, save_path):
+    """Measure how many concurrent notification streams a running server holds."""
+    from urllib.parse import urlsplit
+    from bench import connection_capacity, member_cookie, save
+    app = current_app._get_current_object()
+    target = urlsplit(url)
+    results = connection_capacity(target.hostname, target.port or 80, member_cookie(app),
+                                  connections=connections, probes=probes, timeout=timeout)
+    results['url'] = url
+    click.echo(f"streams: {results['streams_served']}/{connections} served, first event "
+               f"p50 {results['first_event_p50_ms']} ms, p95 {results['first_event_p95_ms']} ms")
+    click.echo(f"probes:  {results['probes_answered']}/{probes} answered, "
+               f"p50 {results['probe_p50_ms']} ms, p95 {results['probe_p95_ms']} ms")
+    if save_path:
+        save(results, save_path)
+        click.echo(f'Saved results to {save_path}')
+
+@click.command('run-worker')
+@with_appcontext
+@click.option('--once', is_flag=True, help='Exit once no job is due.')
+@click.option('--poll', default=None, type=float, help='Seconds between polls when idle.')
+def run_worker(once, poll):
+    """Run queued background jobs."""
+    from jobs import work
+    app = current_app._get_current_object()
+    work(app, once=once, poll_interval=poll or app.config['JOB_POLL_INTERVAL'])
+
+@click.command('purge-jobs')
+@with_appcontext
+@click.option('--days', default=7, show_default=True, help='Keep finished jobs this many days.')
+def purge_jobs(days):
+    """Delete finished background jobs."""
+    from jobs import purge_finished
+    click.echo(f'Deleted {purge_finished(days)} jobs')
+
+@click.command('export')
+@with_appcontext
+@click.argument('name', type=click.Choice(['users', 'requests', 'archived-requests', 'feedback']))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, allow_dash=True), default='-',
+              show_default=True, help='File to write; - for stdout.')
+def export(name, fmt, compress, output):
+    """Stream users, swap requests (live or archived) or feedback as CSV or NDJSON."""
+    from exports import export_chunks, gzip_chunks
+    chunks = export_chunks(name, fmt)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    else:
+        chunks = (chunk.encode() for chunk in chunks)
+    with click.open_file(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+
+def _echo_progress(report):
+    click.echo(f"{report['operation']}: {report['rows']} rows, {report['batches']} batches, "
+               f"{report['rate']:.0f} rows/s")
+
+def _moderate_users(operation, user_ids, email_like, batch_size):
+    from moderation import OPERATIONS
+    if not (user_ids or email_like):
+        raise click.UsageError('Give user ids or --email-like')
+    report = OPERATIONS[operation](user_ids=list(user_ids), email_like=email_like,
+                                   batch_size=batch_size, progress=_echo_progress)
+    click.echo(f"Done: {report['rows']} users in {report['seconds']:.1f}s")
+
+@click.command('ban-users')
+@with_appcontext
+@click.argument('user_ids', nargs=-1, type=int)
+@click.option('--email-like', help='SQL LIKE pattern, e.g. %@spam.example')
+@click.option('--batch-size', default=None, type=int, help='Rows per transaction (default JOB_BATCH_SIZE).')
+def ban_users(user_ids, email_like, batch_size):
+    """Hide users' profiles and cancel their pending requests."""
+    _moderate_users('ban_users', user_ids, email_like, batch_size)
+
+@click.command('unban-users')
+@with_appcontext
+@click.argument('user_ids', nargs=-1, type=int)
+@click.option('--email-like', help='SQL LIKE pattern, e.g. %@spam.example')
+@click.option('--batch-size', default=None, type=int, help='Rows per transaction (default JOB_BATCH_SIZE).')
+def unban_users(user_ids, email_like, batch_size):
+    """Make banned users' profiles public again."""
+    _moderate_users('unban_users', user_ids, email_like, batch_size)
+
+@click.command('clear-swaps')
+@with_appcontext
+@click.option('--status', type=click.Choice(['pending', 'accepted']), default='pending', show_default=True,
+              help='Swaps to cancel.')
+@click.option('--purge', is_flag=True, help='Delete declined and cancelled requests instead of cancelling.')
+@click.option('--older-than', 'days', default=30, show_default=True, help='Age in days.')
+@click.option('--batch-size', default=None, type=int, help='Rows per transaction (default JOB_BATCH_SIZE).')
+def clear_swaps(status, purge, days, batch_size):
+    """Cancel stale swaps, or delete old declined and cancelled ones."""
+    from moderation import cancel_swaps, purge_swaps
+    if purge:
+        report = purge_swaps(older_than_days=days, batch_size=batch_size, progress=_echo_progress)
+    else:
+        report = cancel_swaps(status, older_than_days=days, batch_size=batch_size, progress=_echo_progress)
+    click.echo(f"Done: {report['rows']} swaps in {report['seconds']:.1f}s")
+
+@click.command('archive-swaps')
+@with_appcontext
+@click.option('--older-than', 'days', default=None, type=int, help='Age in days (default ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', default=None, type=int, help='Rows per transaction (default JOB_BATCH_SIZE).')
+def archive_swaps(days, batch_size):
+    """Move old completed, declined and cancelled swaps to the archive table."""
+    from moderation import archive_swaps as archive
+    try:
+        report = archive(older_than_days=days, batch_size=batch_size, progress=_echo_progress)
+    except RuntimeError as e:
+        raise click.ClickException(f'Archiving stopped: {e}')
+    click.echo(f"Done: {report['rows']} swaps in {report['seconds']:.1f}s")
+
+@click.command('rebuild-ratings')
+@with_appcontext
+@click.option('--batch-size', default=None, type=int, help='Users per transaction (default JOB_BATCH_SIZE).')
+def rebuild_ratings(batch_size):
+    """Recompute every user's rating sum, count, average and histogram from feedback."""
+    from ratings import rebuild_ratings as rebuild
+    report = rebuild(batch_size=batch_size,
+                     progress=lambda r: click.echo(f"{r['users']} users checked, {r['changed']} updated"))
+    click.echo(f"Done: {report['changed']} of {report['users']} users updated in {report['seconds']:.1f}s")
+
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes():
+    """EXPLAIN the hot queries and fail if any of them needs a full table scan."""
+    from migrations import explain_hot_queries
+    failed = False
+    for label, (uses_index, plan) in explain_hot_queries().items():
+        click.echo(f"{'ok  ' if uses_index else 'SCAN'} {label}")
+        if not uses_index:
+            failed = True
+            click.echo('     ' + plan.replace('\n', '\n     '))
+    if failed:
+        raise SystemExit(1)
+
+def register_commands(app):
+    for command in (init_db, upgrade_db, seed_db, bench, bench_connections, run_worker, purge_jobs, export,
+                    ban_users, unban_users, clear_swaps, archive_swaps, rebuild_ratings, check_indexes):
+        app.cli.add_command(command)
@@ -0,0 +1,96 @@
+import os
+import time
+from functools import wraps
+from flask import g, session, has_request_context
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+# Engine configuration and read-replica routing.
+# Pool sizes come from the environment. SQLite connections are switched to
+# WAL so readers no longer block behind the single writer. When
+# DATABASE_REPLICA_URL is set it becomes the 'replica' bind, and views
+# decorated with @replica_reads run their SELECTs there; flushes and
+# UPDATE/DELETE statements always go to the primary. After a user writes,
+# their reads stay on the primary for REPLICA_STICKY_SECONDS so they see
+# their own changes despite replication lag.
+REPLICA_BIND = 'replica'
+
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # durable at checkpoints; safe with WAL
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',  # ~20MB page cache per connection
+)
+
+def engine_options(uri):
+    options = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    url = make_url(uri)
+    # In-memory SQLite uses a single shared connection; there is no pool to size
+    if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+        options.update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+            pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        )
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def configure_engines(engines, wal=True):
+    # Called once the engines exist; creating them does not connect
+    for engine in engines:
+        if wal and engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
+
+def replica_reads(view):
+    # Mark a read-only view; its queries may be served by the replica
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.replica_reads = True
+        return view(*args, **kwargs)
+    return wrapper
+
+def _use_replica():
+    return (has_request_context() and g.get('replica_reads')
+            and time.time() >= session.get('primary_until', 0))
+
+class RoutingSession(FlaskSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_replica() \
+                and not getattr(clause, 'is_dml', False):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(Session, 'after_flush')
+def _note_write(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+@event.listens_for(Session, 'do_orm_execute')
+def _note_statement_write(orm_execute_state):
+    # UPDATE/DELETE/INSERT statements run through session.execute()
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _stick_to_primary(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context():
+        from flask import current_app
+        sticky = current_app.config['REPLICA_STICKY_SECONDS']
+        if sticky and current_app.config.get('SQLALCHEMY_BINDS', {}).get(REPLICA_BIND):
+            session['primary_until'] = time.time() + sticky
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_write(db_session):
+    db_session.info.pop('wrote', None)
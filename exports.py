@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app import db
+from models import User, SwapRequest, SwapRequestArchive, Feedback
+
+# Bulk data export for admins. Each export is a single SELECT with the user
+# names joined in SQL, read through a server-side cursor (yield_per) and
+# written as CSV or NDJSON in chunks of roughly CHUNK_SIZE characters, so
+# memory stays flat no matter how many rows there are. Gzip is applied to the
+# stream as it is produced.
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def _users():
+    return select(
+        User.id, User.first_name, User.last_name, User.email, User.location, User.availability,
+        User.is_public, User.is_admin, User.rating_sum, User.rating_count, User.created_at,
+    ).where(User.is_admin == False).order_by(User.id)
+
+def _requests(model=SwapRequest):
+    requester = aliased(User)
+    requested = aliased(User)
+    return select(
+        model.id, model.status,
+        model.requester_id, (requester.first_name + ' ' + requester.last_name).label('requester_name'),
+        model.requested_id, (requested.first_name + ' ' + requested.last_name).label('requested_name'),
+        model.skill_offered, model.skill_wanted, model.message,
+        model.created_at, model.updated_at,
+    ).join(requester, requester.id == model.requester_id) \
+     .join(requested, requested.id == model.requested_id).order_by(model.id)
+
+def _feedback():
+    giver = aliased(User)
+    receiver = aliased(User)
+    return select(
+        Feedback.id, Feedback.swap_request_id,
+        Feedback.from_user_id, (giver.first_name + ' ' + giver.last_name).label('from_name'),
+        Feedback.to_user_id, (receiver.first_name + ' ' + receiver.last_name).label('to_name'),
+        Feedback.rating, Feedback.comment, Feedback.created_at,
+    ).join(giver, giver.id == Feedback.from_user_id) \
+     .join(receiver, receiver.id == Feedback.to_user_id).order_by(Feedback.id)
+
+EXPORTS = {
+    'users': _users,
+    'requests': _requests,
+    'archived-requests': lambda: _requests(SwapRequestArchive),
+    'feedback': _feedback,
+}
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_chunks(name, fmt='csv', batch_size=BATCH_SIZE):
+    # Yields text chunks; the caller owns the app context for the whole stream
+    stmt = EXPORTS[name]().execution_options(yield_per=batch_size)
+    result = db.session.execute(stmt)
+    columns = list(result.keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+    try:
+        for row in result:
+            if writer:
+                writer.writerow([_value(value) for value in row])
+            else:
+                buffer.write(json.dumps(dict(zip(columns, map(_value, row)))) + '\n')
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        result.close()
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -79,4 +79,20 @@ class SearchForm(FlaskForm):
         ('writing', 'Writing'),
         ('other', 'Other')
     ])
-    submit = SubmitField('Search')
\ No newline at end of file
+    submit = SubmitField('Search')
+
+class BulkUserForm(FlaskForm):
+    # Selected rows arrive as user_ids checkboxes; the pattern matches any number of users
+    email_like = StringField('Email pattern', validators=[Optional(), Length(max=120)], render_kw={"placeholder": "e.g. %@spam.example"})
+    ban = SubmitField('Ban')
+    unban = SubmitField('Unban')
+
+class SwapCleanupForm(FlaskForm):
+    action = SelectField('Action', choices=[
+        ('cancel_pending', 'Cancel pending requests'),
+        ('cancel_accepted', 'Cancel accepted swaps'),
+        ('purge', 'Delete declined and cancelled requests'),
+        ('archive', 'Archive completed, declined and cancelled requests')
+    ])
+    older_than_days = IntegerField('Older than (days)', default=30, validators=[DataRequired(), NumberRange(min=1)])
+    submit = SubmitField('Run')
\ No newline at end of file
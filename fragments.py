@@ -0,0 +1,46 @@
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy.orm import selectinload
+from cache import get_cache
+from models import User
+
+# Rendered HTML that looks the same to every viewer: browse cards and the
+# public summary at the top of profile pages. Entries are keyed by user id
+# and User.version, which is bumped whenever a profile field, skill or rating
+# changes, so nothing is ever invalidated; a new version just misses and the
+# old entry ages out of the LRU. CACHE_BACKEND=local shares them across
+# workers.
+
+def _key(kind, user):
+    return f'{kind}:{user.id}:{user.version}'
+
+def _render(kind, template, user):
+    html = render_template(template, user=user)
+    get_cache('fragments').set(_key(kind, user), html, ttl=current_app.config['FRAGMENT_CACHE_TTL'])
+    return Markup(html)
+
+def user_cards(users):
+    # {user_id: card html}; skills are only loaded, in one batch, for misses
+    cache = get_cache('fragments')
+    cards, missing = {}, []
+    for user in users:
+        html = cache.get(_key('card', user))
+        if html is None:
+            missing.append(user)
+        else:
+            cards[user.id] = Markup(html)
+    if missing:
+        # The users are already in the session; this fills in their skills
+        User.query.filter(User.id.in_([user.id for user in missing])).options(
+            selectinload(User.skills_offered),
+            selectinload(User.skills_wanted)
+        ).all()
+        for user in missing:
+            cards[user.id] = _render('card', 'user_card.html', user)
+    return cards
+
+def profile_summary(user):
+    html = get_cache('fragments').get(_key('summary', user))
+    if html is None:
+        return _render('summary', 'profile_summary.html', user)
+    return Markup(html)
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import time
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from sqlalchemy import func
+from app import db
+from models import User, SwapRequest, SwapRequestArchive, ARCHIVABLE_STATUSES
+
+# Conditional GETs. A view decorated with @conditional(stamp) first calls
+# stamp(*args, **kwargs), which returns a cheap version stamp of everything
+# the response depends on: indexed MAX/COUNT lookups and per-user version
+# counters, never the page query itself. The stamp, URL and viewer are hashed
+# into a weak ETag, and when the client already holds it the view is skipped
+# with 304 Not Modified. Responses differ per logged-in user, so they are
+# private and Vary on Cookie. Only ETags are used: deleting a row (a
+# cancelled request, a removed skill) moves no timestamp, so Last-Modified
+# would validate stale copies.
+
+_templates_digest = None
+
+def _templates_stamp():
+    # Deploys change pages without changing any data
+    global _templates_digest
+    if _templates_digest is None:
+        digest = hashlib.sha1()
+        folder = os.path.join(current_app.root_path, current_app.template_folder)
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            for name in sorted(files):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(name.encode() + f.read())
+        _templates_digest = digest.hexdigest()
+    return _templates_digest
+
+def _csrf_window():
+    # A revalidated page keeps the CSRF token it was rendered with, so pages
+    # are retired at half the token lifetime
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    return int(time.time() // (limit / 2)) if limit else 0
+
+def page_stamp():
+    # What base.html shows the viewer: nav badges and admin links
+    from broadcasts import unread_message_count
+    return (current_user.version, current_user.unread_notifications or 0,
+            unread_message_count(current_user), _csrf_window())
+
+def directory_stamp():
+    # Changes whenever any public profile, skill list or rating changes
+    return db.session.query(func.max(User.profile_updated_at)).scalar()
+
+def swaps_stamp(user_id, status):
+    # Same rows as serializers.swap_page: live, plus archived for finished
+    # statuses, combined so that archiving a row leaves the stamp unchanged
+    models = (SwapRequest, SwapRequestArchive) if status in ARCHIVABLE_STATUSES else (SwapRequest,)
+    count, latest = 0, None
+    for model in models:
+        n, newest = db.session.query(func.count(model.id), func.max(model.updated_at)).filter(
+            ((model.requester_id == user_id) | (model.requested_id == user_id)) &
+            (model.status == status)
+        ).one()
+        count += n
+        if newest is not None and (latest is None or newest > latest):
+            latest = newest
+    return count, latest
+
+def conditional(stamp):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flashes are shown once, so that page can't be reused
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+            parts = stamp(*args, **kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+            # NOTIFICATION_PUSH changes the script in base.html
+            etag = hashlib.sha1(repr(
+                (_templates_stamp(), current_app.config['NOTIFICATION_PUSH'],
+                 request.full_path, current_user.get_id(), parts)
+            ).encode()).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,75 @@
+import uuid
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import db
+from cache import get_cache
+
+# Identity cache in front of login_manager.user_loader. The user's columns
+# are cached (password_hash excluded) and rebuilt into a session-attached
+# User without a query. After any commit that changes the row, the entry is
+# dropped and the user's generation marker replaced, so with the shared
+# 'local' cache backend every worker sees it. Entries carry the generation
+# read before their row was loaded: a request that loaded the row before the
+# commit and caches it afterwards stores an outdated generation, and the
+# entry is ignored. Misses always read the primary, never a lagging replica.
+# IDENTITY_CACHE_TTL=0 turns the cache off.
+EXCLUDED_COLUMNS = {'password_hash'}
+
+def _key(user_id):
+    return f'identity:{user_id}'
+
+def _generation_key(user_id):
+    return f'identity-generation:{user_id}'
+
+def load_identity(user_id):
+    from models import User
+    cache = get_cache('identity')
+    ttl = current_app.config['IDENTITY_CACHE_TTL']
+    if ttl <= 0:
+        return db.session.get(User, user_id)
+    entry = cache.get(_key(user_id))
+    generation = cache.get(_generation_key(user_id))
+    if entry is None or entry[0] != generation:
+        user = db.session.get(User, user_id, bind_arguments={'bind': db.engine})
+        if user is not None:
+            values = {column.key: getattr(user, column.key)
+                      for column in inspect(User).column_attrs
+                      if column.key not in EXCLUDED_COLUMNS}
+            cache.set(_key(user_id), (generation, values), ttl=ttl)
+        return user
+
+    user = User(**entry[1])
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def mark_identity_stale(session, user_id):
+    # Invalidated once the session commits
+    session.info.setdefault('stale_identities', set()).add(user_id)
+
+def forget_identities(user_ids):
+    # Drop entries directly, for bulk updates that bypass the session. The
+    # new generation outlives any entry a concurrent request could still
+    # write from the old row
+    cache = get_cache('identity')
+    generation = uuid.uuid4().hex
+    for user_id in user_ids:
+        cache.set(_generation_key(user_id), generation, ttl=2 * current_app.config['IDENTITY_CACHE_TTL'])
+    cache.delete(*(_key(user_id) for user_id in user_ids))
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_users(session, flush_context, instances):
+    from models import User
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            mark_identity_stale(session, obj.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_identities(session):
+    stale = session.info.pop('stale_identities', None)
+    if stale:
+        forget_identities(stale)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_identities(session):
+    session.info.pop('stale_identities', None)
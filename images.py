@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, send_from_directory, url_for, abort
+from werkzeug.utils import secure_filename
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Profile photo pipeline. Uploads are streamed to disk under a content-hash
+# name (identical files are stored once), then a background pool renders
+# square JPEG variants. Everything is served through /media with long-lived
+# cache headers since a given name never changes content. Without Pillow no
+# variants are produced and the original is served instead.
+logger = logging.getLogger(__name__)
+
+if Image is None:
+    logger.warning('Pillow is not installed; profile photos are served full size without resized variants')
+
+VARIANTS = {'thumb': 96, 'avatar': 320}
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def upload_dir():
+    # UPLOAD_FOLDER may be absolute or relative to the app
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+def variant_name(filename, variant):
+    return f"{filename.rsplit('.', 1)[0]}-{variant}.jpg"
+
+def _get_executor():
+    # Created per process; threads do not survive a gunicorn fork
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'],
+                                           thread_name_prefix='images')
+            _executor_pid = os.getpid()
+    return _executor
+
+def save_upload(file, extension):
+    # Stream the upload to disk in chunks while hashing; returns the stored name
+    directory = upload_dir()
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        filename = f'{digest.hexdigest()[:32]}.{extension}'
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            os.unlink(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    if Image is not None:
+        _get_executor().submit(build_variants, directory, filename)
+    return filename
+
+def build_variants(directory, filename):
+    source = os.path.join(directory, filename)
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original).convert('RGB')
+            for variant, size in VARIANTS.items():
+                target = os.path.join(directory, variant_name(filename, variant))
+                if os.path.exists(target):
+                    continue
+                resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                temp_path = target + '.part'
+                resized.save(temp_path, 'JPEG', quality=85, optimize=True, progressive=True)
+                os.replace(temp_path, target)
+    except Exception:
+        logger.exception('Could not build variants for %s', filename)
+
+def photo_url(filename, variant='thumb'):
+    return url_for('main.media', variant=variant, filename=filename)
+
+def send_photo(variant, filename):
+    filename = secure_filename(filename)
+    if not filename:
+        abort(404)
+    directory = upload_dir()
+    if variant in VARIANTS:
+        name = variant_name(filename, variant)
+        if os.path.exists(os.path.join(directory, name)):
+            response = send_from_directory(directory, name, max_age=IMMUTABLE_MAX_AGE)
+            response.headers['Cache-Control'] += ', immutable'
+            return response
+        # Variant not rendered yet (or a legacy upload): serve the original,
+        # but only briefly so the browser picks up the variant later
+        return send_from_directory(directory, filename, max_age=60)
+    if variant != 'original':
+        abort(404)
+    response = send_from_directory(directory, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.headers['Cache-Control'] += ', immutable'
+    return response
@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, update, select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from models import User, SwapRequest, Job
+from notifications import notify
+from stats import invalidate_admin_stats
+
+# Database-backed job queue for the side effects of state changes. A handler
+# enqueues a job in the same transaction as its state change, so the job
+# exists exactly when the change does. Workers claim due jobs with a
+# conditional UPDATE, run them, and mark them done in the handler's own
+# transaction; failures are retried with exponential backoff up to
+# max_attempts. Jobs run either in a background thread of the web process
+# (JOB_RUNNER=thread) or in separate `flask run-worker` processes
+# (JOB_RUNNER=external).
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+def job(name):
+    # Register a handler; it is called with the enqueued keyword arguments
+    def register(func):
+        HANDLERS[name] = func
+        return func
+    return register
+
+def enqueue(name, key=None, delay=0, **payload):
+    # Queue a job in the current transaction; returns None if a job with the
+    # same idempotency key is already outstanding
+    new_job = Job(name=name, payload=json.dumps(payload), idempotency_key=key,
+                  run_at=datetime.utcnow() + timedelta(seconds=delay),
+                  max_attempts=current_app.config['JOB_MAX_ATTEMPTS'])
+    try:
+        with db.session.begin_nested():
+            db.session.add(new_job)
+    except IntegrityError:
+        return None
+    db.session.info['jobs_enqueued'] = True
+    return new_job
+
+def on_commit(callback):
+    # Run callback once the current transaction commits (dropped on rollback)
+    db.session.info.setdefault('post_commit', []).append(callback)
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    callbacks = session.info.pop('post_commit', ())
+    enqueued = session.info.pop('jobs_enqueued', False)
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception('Post-commit callback failed')
+    if enqueued and has_app_context() and current_app.config['JOB_RUNNER'] == 'thread':
+        _runner.wake(current_app._get_current_object())
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('post_commit', None)
+    session.info.pop('jobs_enqueued', None)
+
+def claim_next():
+    # Atomically take the oldest due job; jobs left running past
+    # JOB_LOCK_TIMEOUT (a worker died) are taken over
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT'])
+    claimable = ((Job.status == 'queued') & (Job.run_at <= now)) | \
+                ((Job.status == 'running') & (Job.locked_at < stale))
+    while True:
+        job_id = db.session.execute(
+            select(Job.id).where(claimable).order_by(Job.run_at, Job.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, claimable)
+            .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id, populate_existing=True)
+        # Another worker got there first
+
+def run_job(claimed):
+    # Returns True if the job completed
+    job_id = claimed.id
+    try:
+        handler = HANDLERS.get(claimed.name)
+        if handler is None:
+            raise LookupError(f'No handler registered for job {claimed.name!r}')
+        handler(**json.loads(claimed.payload))
+        claimed = db.session.get(Job, job_id)
+        claimed.status = 'done'
+        claimed.finished_at = datetime.utcnow()
+        claimed.last_error = None
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        logger.exception('Job %s (%s) failed', job_id, claimed.name)
+        failed = db.session.get(Job, job_id, populate_existing=True)
+        failed.last_error = traceback.format_exc()[-4000:]
+        if failed.attempts >= failed.max_attempts:
+            failed.status = 'failed'
+            failed.finished_at = datetime.utcnow()
+        else:
+            backoff = current_app.config['JOB_RETRY_DELAY'] * 2 ** (failed.attempts - 1)
+            failed.status = 'queued'
+            failed.run_at = datetime.utcnow() + timedelta(seconds=min(backoff, 3600))
+        db.session.commit()
+        return False
+
+def work(app, once=False, poll_interval=1.0, stop=None):
+    # Worker loop; with once=True it returns when no job is due
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        with app.app_context():
+            ran = 0
+            while not stop.is_set():
+                claimed = claim_next()
+                if claimed is None:
+                    break
+                run_job(claimed)
+                ran += 1
+        if once and not ran:
+            return
+        if not ran:
+            stop.wait(poll_interval)
+
+def purge_finished(older_than_days):
+    # Drop completed jobs; failed ones are kept for inspection
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    deleted = db.session.execute(
+        delete(Job).where(Job.status == 'done', Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+class _ThreadRunner:
+    # In-process worker for single-host deployments: a daemon thread per
+    # process, woken after each commit that enqueued work
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._wakeup = threading.Event()
+
+    def wake(self, app):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(app,), name='jobs', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self, app):
+        while True:
+            self._wakeup.clear()
+            try:
+                work(app, once=True)
+            except Exception:
+                logger.exception('Job runner crashed')
+            # Also poll so retries with backoff get picked up
+            self._wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+
+_runner = _ThreadRunner()
+
+# Handlers. Each must be safe to run more than once.
+
+@job('notify_user')
+def notify_user(user_id):
+    # Bump the unread counter and push it; both land with the job's commit
+    unread_count = User.increment_notifications(user_id)
+    on_commit(lambda: notify(user_id, unread_count))
+
+@job('cancel_pending_swaps')
+def cancel_pending_swaps(user_id):
+    # Cancel in batches so no single transaction holds the swap table long
+    batch_size = current_app.config['JOB_BATCH_SIZE']
+    involved = (SwapRequest.requester_id == user_id) | (SwapRequest.requested_id == user_id)
+    while True:
+        ids = db.session.execute(
+            select(SwapRequest.id).where(involved, SwapRequest.status == 'pending').limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        db.session.execute(
+            update(SwapRequest).where(SwapRequest.id.in_(ids), SwapRequest.status == 'pending')
+            .values(status='cancelled', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    invalidate_admin_stats()
+
+@job('bulk_moderation')
+def bulk_moderation(operation, **options):
+    # Started from the admin pages; progress is reported through the cache
+    from moderation import OPERATIONS
+    OPERATIONS[operation](**options)
@@ -0,0 +1,232 @@
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from models import User, Skill, SkillWanted
+
+# Reciprocal skill matching. Inverted indexes map a normalized skill name to
+# the users offering / wanting it, so candidates for a user come from a few
+# set lookups instead of a scan. The index is built lazily per worker, users
+# whose skills or profile change are refreshed on the next lookup, and the
+# whole index is rebuilt every MATCH_INDEX_TTL seconds to pick up changes
+# made through other workers. That rebuild runs on a background thread into
+# a separate index which is swapped in when complete; lookups keep using the
+# previous one meanwhile.
+logger = logging.getLogger(__name__)
+
+def normalize_skill(name):
+    return re.sub(r'\s+', ' ', (name or '').strip().lower())
+
+def _normalize_location(location):
+    return (location or '').strip().lower()
+
+class MatchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.built_at = None
+        self.built_stamp = None
+        self.stale_users = set()
+        self.rebuilding = None
+        self.changed_while_rebuilding = set()
+        self._reset()
+
+    def _reset(self):
+        self.offered_by = defaultdict(set)
+        self.wanted_by = defaultdict(set)
+        self.offers = defaultdict(set)
+        self.wants = defaultdict(set)
+        self.categories = defaultdict(set)
+        self.profiles = {}
+
+    def _add_profile(self, user_id, location, rating_sum, rating_count, listed):
+        self.profiles[user_id] = {
+            'location': _normalize_location(location),
+            'rating': rating_sum / rating_count if rating_count else 0,
+            'listed': listed,
+        }
+
+    def _add_skill(self, user_id, name, category, offered):
+        name = normalize_skill(name)
+        if offered:
+            self.offered_by[name].add(user_id)
+            self.offers[user_id].add(name)
+        else:
+            self.wanted_by[name].add(user_id)
+            self.wants[user_id].add(name)
+        if category:
+            self.categories[user_id].add(category)
+
+    def _remove_user(self, user_id):
+        for name in self.offers.pop(user_id, ()):
+            self.offered_by[name].discard(user_id)
+        for name in self.wants.pop(user_id, ()):
+            self.wanted_by[name].discard(user_id)
+        self.categories.pop(user_id, None)
+        self.profiles.pop(user_id, None)
+
+    def _profile_rows(self, user_ids=None):
+        query = db.session.query(User.id, User.location, User.rating_sum, User.rating_count,
+                                 User.is_public, User.is_admin)
+        if user_ids is not None:
+            query = query.filter(User.id.in_(user_ids))
+        return query
+
+    def _skill_rows(self, model, user_ids=None):
+        query = db.session.query(model.user_id, model.name, model.category)
+        if user_ids is not None:
+            query = query.filter(model.user_id.in_(user_ids))
+        return query.yield_per(5000)
+
+    def _load(self):
+        # Fill this (not yet shared) index from the database
+        for user_id, location, rating_sum, rating_count, is_public, is_admin in self._profile_rows():
+            self._add_profile(user_id, location, rating_sum, rating_count, bool(is_public) and not is_admin)
+        for user_id, name, category in self._skill_rows(Skill):
+            self._add_skill(user_id, name, category, offered=True)
+        for user_id, name, category in self._skill_rows(SkillWanted):
+            self._add_skill(user_id, name, category, offered=False)
+
+    def build(self):
+        with self.build_lock:
+            self._build()
+
+    def _build(self):
+        # Load a complete index without holding the lock, then swap it in.
+        # Users changed while it loaded may be missing from it, so they stay
+        # stale and are refreshed on the next lookup
+        with self.lock:
+            self.changed_while_rebuilding = set()
+        started = time.monotonic()
+        fresh = MatchIndex()
+        fresh._load()
+        with self.lock:
+            self.offered_by, self.wanted_by = fresh.offered_by, fresh.wanted_by
+            self.offers, self.wants = fresh.offers, fresh.wants
+            self.categories, self.profiles = fresh.categories, fresh.profiles
+            self.stale_users = self.changed_while_rebuilding
+            self.changed_while_rebuilding = set()
+            self.built_at = started
+            self.built_stamp = time.time()
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                self.build()
+        except Exception:
+            logger.exception('Match index rebuild failed')
+        finally:
+            with self.lock:
+                self.rebuilding = None
+
+    def refresh(self, user_ids):
+        # Reload just these users' profiles and skills
+        user_ids = list(user_ids)
+        with self.lock:
+            for user_id in user_ids:
+                self._remove_user(user_id)
+            for user_id, location, rating_sum, rating_count, is_public, is_admin in self._profile_rows(user_ids):
+                self._add_profile(user_id, location, rating_sum, rating_count, bool(is_public) and not is_admin)
+            for user_id, name, category in self._skill_rows(Skill, user_ids):
+                self._add_skill(user_id, name, category, offered=True)
+            for user_id, name, category in self._skill_rows(SkillWanted, user_ids):
+                self._add_skill(user_id, name, category, offered=False)
+            self.stale_users.difference_update(user_ids)
+
+    def mark_stale(self, user_ids):
+        with self.lock:
+            self.stale_users.update(user_ids)
+            if self.build_lock.locked():
+                self.changed_while_rebuilding.update(user_ids)
+
+    def ensure_fresh(self, ttl):
+        if self.built_at is None:
+            # Nothing to serve yet: the first lookup in a worker waits
+            with self.build_lock:
+                if self.built_at is None:
+                    self._build()
+        with self.lock:
+            if time.monotonic() - self.built_at > ttl and self.rebuilding is None:
+                self.rebuilding = threading.Thread(target=self._rebuild, args=(current_app._get_current_object(),),
+                                                   name='match-index', daemon=True)
+                self.rebuilding.start()
+            if self.stale_users:
+                self.refresh(set(self.stale_users))
+
+    def top_matches(self, user_id, k=20):
+        # Returns [(score, candidate_id, details)] best first
+        with self.lock:
+            my_offers = self.offers.get(user_id, set())
+            my_wants = self.wants.get(user_id, set())
+            my_location = self.profiles.get(user_id, {}).get('location')
+            my_categories = self.categories.get(user_id, set())
+
+            they_offer = Counter()
+            for name in my_wants:
+                they_offer.update(self.offered_by.get(name, ()))
+            they_want = Counter()
+            for name in my_offers:
+                they_want.update(self.wanted_by.get(name, ()))
+
+            scored = []
+            for candidate in set(they_offer) | set(they_want):
+                profile = self.profiles.get(candidate)
+                if candidate == user_id or not profile or not profile['listed']:
+                    continue
+                offers, wants = they_offer[candidate], they_want[candidate]
+                # Two-way swaps dominate; one-way overlap still ranks
+                score = 3 * min(offers, wants) + offers + wants
+                categories = self.categories.get(candidate, set())
+                if my_categories and categories:
+                    score += len(my_categories & categories) / len(my_categories | categories)
+                score += profile['rating'] / 5
+                if my_location and profile['location'] == my_location:
+                    score += 1
+                scored.append((score, -candidate))
+
+            # Explain only the winners
+            return [(score, -candidate, {
+                'they_offer': sorted(self.offers[-candidate] & my_wants),
+                'they_want': sorted(self.wants[-candidate] & my_offers),
+                'reciprocal': they_offer[-candidate] > 0 and they_want[-candidate] > 0,
+            }) for score, candidate in heapq.nlargest(k, scored)]
+
+_index = MatchIndex()
+
+def find_matches(user_id, k=20):
+    _index.ensure_fresh(current_app.config['MATCH_INDEX_TTL'])
+    return _index.top_matches(user_id, k)
+
+def index_stamp():
+    # When this worker's index was built, for ETags of match responses
+    _index.ensure_fresh(current_app.config['MATCH_INDEX_TTL'])
+    return _index.built_stamp
+
+def mark_users_stale(session, user_ids):
+    # For bulk UPDATEs that bypass the ORM; applied when the session commits
+    session.info.setdefault('match_stale_users', set()).update(user_ids)
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_skills(session, flush_context, instances):
+    changed = session.info.setdefault('match_stale_users', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Skill, SkillWanted)) and obj.user_id:
+            changed.add(obj.user_id)
+        elif isinstance(obj, User) and obj.id:
+            changed.add(obj.id)
+
+@event.listens_for(Session, 'after_commit')
+def _mark_index_stale(session):
+    changed = session.info.pop('match_stale_users', None)
+    if changed:
+        _index.mark_stale(changed)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_index_changes(session):
+    session.info.pop('match_stale_users', None)
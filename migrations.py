@@ -0,0 +1,261 @@
+from datetime import datetime
+from sqlalchemy import (Table, Column, Integer, String, Text, DateTime, MetaData, ForeignKey, Index,
+                        inspect, select, func, text)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
+from app import db
+from models import User, Skill, SkillWanted, SwapRequest, SwapRequestArchive, Feedback, AdminMessage
+from ratings import BUCKETS, rebuild_batch
+
+# Versioned schema migrations applied on top of db.create_all().
+# create_all() builds the latest schema for a fresh database but never alters
+# existing tables, so every step here checks before it changes anything.
+schema_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migration', schema_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+def _add_column(conn, table, name, ddl):
+    # Returns True if the column had to be added
+    existing = {column['name'] for column in inspect(conn).get_columns(table)}
+    if name in existing:
+        return False
+    quoted = conn.dialect.identifier_preparer.quote(table)
+    conn.execute(text(f'ALTER TABLE {quoted} ADD COLUMN {name} {ddl}'))
+    return True
+
+def _rating_aggregates(conn):
+    added = _add_column(conn, User.__tablename__, 'rating_sum', "INTEGER DEFAULT 0 NOT NULL")
+    added = _add_column(conn, User.__tablename__, 'rating_count', "INTEGER DEFAULT 0 NOT NULL") or added
+    if added:
+        # Backfill from existing feedback
+        users = User.__table__
+        feedback = Feedback.__table__
+        conn.execute(users.update().values(
+            rating_sum=select(func.coalesce(func.sum(feedback.c.rating), 0))
+                .where(feedback.c.to_user_id == users.c.id).scalar_subquery(),
+            rating_count=select(func.count(feedback.c.id))
+                .where(feedback.c.to_user_id == users.c.id).scalar_subquery(),
+        ))
+
+def _create_indexes(conn, table, indexes):
+    # Steps name their indexes as of their own version: the models' current
+    # index set can cover columns that only a later step adds
+    quote = conn.dialect.identifier_preparer.quote
+    for name, columns in indexes:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} '
+                          f'({", ".join(quote(column) for column in columns)})'))
+
+HOT_PATH_INDEXES = {
+    'user': [
+        ('ix_user_created_at', ('created_at', 'id')),
+        ('ix_user_is_admin_created_at', ('is_admin', 'created_at', 'id')),
+    ],
+    'skill': [
+        ('ix_skill_user_id', ('user_id',)),
+        ('ix_skill_category_user_id', ('category', 'user_id')),
+    ],
+    'skill_wanted': [
+        ('ix_skill_wanted_user_id', ('user_id',)),
+        ('ix_skill_wanted_category_user_id', ('category', 'user_id')),
+    ],
+    'swap_request': [
+        ('ix_swap_request_requester_status', ('requester_id', 'status', 'updated_at')),
+        ('ix_swap_request_requested_status', ('requested_id', 'status', 'updated_at')),
+        ('ix_swap_request_status_created_at', ('status', 'created_at')),
+        ('ix_swap_request_created_at', ('created_at', 'id')),
+    ],
+    'feedback': [
+        ('ix_feedback_swap_request_to_user', ('swap_request_id', 'to_user_id')),
+        ('ix_feedback_from_to_swap_request', ('from_user_id', 'to_user_id', 'swap_request_id')),
+        ('ix_feedback_to_user_id', ('to_user_id',)),
+    ],
+}
+
+def _hot_path_indexes(conn):
+    for table, indexes in HOT_PATH_INDEXES.items():
+        _create_indexes(conn, table, indexes)
+
+def _message_watermark(conn):
+    if _add_column(conn, User.__tablename__, 'last_seen_message_id', "INTEGER DEFAULT 0 NOT NULL"):
+        # Existing members start caught up rather than with the whole history unread
+        latest = conn.execute(select(func.coalesce(func.max(AdminMessage.id), 0))).scalar()
+        conn.execute(User.__table__.update().values(last_seen_message_id=latest))
+    _create_indexes(conn, AdminMessage.__tablename__, [('ix_admin_message_created_at', ('created_at', 'id'))])
+
+def _profile_version(conn):
+    _add_column(conn, User.__tablename__, 'version', "INTEGER DEFAULT 0 NOT NULL")
+    if _add_column(conn, User.__tablename__, 'profile_updated_at', conn.dialect.type_compiler.process(DateTime())):
+        users = User.__table__
+        conn.execute(users.update().values(profile_updated_at=users.c.created_at))
+    _create_indexes(conn, User.__tablename__, [('ix_user_profile_updated_at', ('profile_updated_at',))])
+
+# Tables that steps create, as they stood at that step's version
+frozen_metadata = MetaData()
+Table('user', frozen_metadata, Column('id', Integer, primary_key=True))  # only referenced
+swap_request_archive_v5 = Table(
+    'swap_request_archive', frozen_metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('requester_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('requested_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('skill_offered', String(100), nullable=False),
+    Column('skill_wanted', String(100), nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('message', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    Column('archived_at', DateTime),
+    Index('ix_swap_request_archive_requester_status', 'requester_id', 'status', 'updated_at'),
+    Index('ix_swap_request_archive_requested_status', 'requested_id', 'status', 'updated_at'),
+)
+swap_request_v7 = Table(
+    'swap_request', frozen_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('requester_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('requested_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('skill_offered', String(100), nullable=False),
+    Column('skill_wanted', String(100), nullable=False),
+    Column('status', String(20)),
+    Column('message', Text),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+    sqlite_autoincrement=True,
+)
+
+def _swap_archive(conn):
+    swap_request_archive_v5.create(conn, checkfirst=True)
+    # Feedback may now point at an archived swap. SQLite doesn't enforce
+    # foreign keys (and can't drop one without rebuilding the table)
+    if conn.dialect.name != 'sqlite':
+        for fk in inspect(conn).get_foreign_keys(Feedback.__tablename__):
+            if fk['referred_table'] == SwapRequest.__tablename__ and fk.get('name'):
+                quoted = conn.dialect.identifier_preparer.quote
+                conn.execute(text(f'ALTER TABLE {quoted(Feedback.__tablename__)} DROP CONSTRAINT {quoted(fk["name"])}'))
+
+def _rating_histogram(conn):
+    added = False
+    for bucket in BUCKETS:
+        added = _add_column(conn, User.__tablename__, bucket, "INTEGER DEFAULT 0 NOT NULL") or added
+    added = _add_column(conn, User.__tablename__, 'rating_avg', "FLOAT DEFAULT 0 NOT NULL") or added
+    if added:
+        # Backfill from existing feedback, a batch of users at a time
+        ids = conn.execute(select(User.__table__.c.id).order_by(User.__table__.c.id)).scalars().all()
+        for start in range(0, len(ids), 1000):
+            rebuild_batch(conn, ids[start:start + 1000])
+    _create_indexes(conn, User.__tablename__, [('ix_user_rating_avg', ('rating_avg', 'id'))])
+
+def _swap_ids_never_reused(conn):
+    # Archived swaps keep their ids; a reused id would point their feedback at
+    # a new swap. Both the rebuilt SQLite table and PostgreSQL's sequence
+    # continue past the highest id ever archived
+    live = swap_request_v7
+    archive = swap_request_archive_v5
+    top = max(conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar() for table in (live, archive))
+    quote = conn.dialect.identifier_preparer.quote
+    if conn.dialect.name == 'sqlite':
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                           {'name': live.name}).scalar()
+        if 'AUTOINCREMENT' not in ddl.upper():
+            # AUTOINCREMENT can't be added in place: copy into a rebuilt table
+            name, new = quote(live.name), quote(f'{live.name}_new')
+            columns = ', '.join(quote(column.name) for column in live.columns)
+            create = str(CreateTable(live).compile(dialect=conn.dialect)).strip()
+            conn.execute(text(f'DROP TABLE IF EXISTS {new}'))
+            conn.execute(text(create.replace(f'CREATE TABLE {name}', f'CREATE TABLE {new}', 1)))
+            conn.execute(text(f'INSERT INTO {new} ({columns}) SELECT {columns} FROM {name}'))
+            conn.execute(text(f'DROP TABLE {name}'))
+            conn.execute(text(f'ALTER TABLE {new} RENAME TO {name}'))
+            _create_indexes(conn, live.name, HOT_PATH_INDEXES[live.name])
+        seq = conn.execute(text('SELECT seq FROM sqlite_sequence WHERE name = :name'), {'name': live.name}).scalar()
+        conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': live.name})
+        conn.execute(text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                     {'name': live.name, 'seq': max(seq or 0, top)})
+    elif conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT setval(s, GREATEST(nextval(s), :top)) FROM pg_get_serial_sequence(:table, 'id') AS s"),
+                     {'table': quote(live.name), 'top': top})
+
+# (version, name, callable) - append only, never renumber
+MIGRATIONS = [
+    (1, 'rating_aggregates', _rating_aggregates),
+    (2, 'hot_path_indexes', _hot_path_indexes),
+    (3, 'message_watermark', _message_watermark),
+    (4, 'profile_version', _profile_version),
+    (5, 'swap_archive', _swap_archive),
+    (6, 'rating_histogram', _rating_histogram),
+    (7, 'swap_ids_never_reused', _swap_ids_never_reused),
+]
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def upgrade():
+    # Apply pending migrations in order; returns the names of those applied
+    applied = []
+    with db.engine.begin() as conn:
+        done = applied_versions(conn)
+        for version, name, migration in MIGRATIONS:
+            if version in done:
+                continue
+            migration(conn)
+            applied.append(name)
+            try:
+                with conn.begin_nested():
+                    conn.execute(schema_migrations.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()))
+            except IntegrityError:
+                # Another worker recorded it first; the steps are idempotent
+                pass
+    return applied
+
+def _hot_queries():
+    # Representative shapes of the per-user, admin and feedback lookups
+    uid = 1
+    return {
+        'dashboard pending': SwapRequest.query.filter_by(requested_id=uid, status='pending'),
+        'sent requests': SwapRequest.query.filter_by(requester_id=uid),
+        'api active swaps': SwapRequest.query.filter(
+            ((SwapRequest.requester_id == uid) | (SwapRequest.requested_id == uid)) &
+            (SwapRequest.status == 'accepted')
+        ).order_by(SwapRequest.updated_at.desc()),
+        'archived completed swaps': SwapRequestArchive.query.filter(
+            ((SwapRequestArchive.requester_id == uid) | (SwapRequestArchive.requested_id == uid)) &
+            (SwapRequestArchive.status == 'completed')
+        ).order_by(SwapRequestArchive.updated_at.desc()),
+        'admin requests': SwapRequest.query.order_by(SwapRequest.created_at.desc(), SwapRequest.id.desc()).limit(50),
+        'admin status count': SwapRequest.query.filter_by(status='pending').with_entities(func.count()),
+        'feedback for swap': Feedback.query.filter_by(swap_request_id=uid, to_user_id=uid),
+        'existing feedback': Feedback.query.filter_by(from_user_id=uid, to_user_id=uid, swap_request_id=uid),
+        'user skills': Skill.query.filter_by(user_id=uid),
+        'user wanted skills': SkillWanted.query.filter_by(user_id=uid),
+        'skills by category': Skill.query.filter_by(category='design').with_entities(Skill.user_id),
+        'message feed': AdminMessage.query.order_by(AdminMessage.created_at.desc(), AdminMessage.id.desc()).limit(20),
+        'unread messages': AdminMessage.query.filter(AdminMessage.id > uid).with_entities(AdminMessage.id).limit(100),
+        'admin users': User.query.filter_by(is_admin=False).order_by(User.created_at.desc(), User.id.desc()).limit(50),
+        'browse by rating': User.query.order_by(User.rating_avg.desc(), User.id.desc()).limit(20),
+    }
+
+def explain_hot_queries():
+    # Returns {label: (uses_index, plan text)} for each hot query
+    dialect = db.engine.dialect
+    results = {}
+    with db.engine.connect() as conn:
+        if dialect.name == 'postgresql':
+            # Tiny tables always seq-scan; ask whether an index is usable at all
+            conn.execute(text('SET enable_seqscan = off'))
+        for label, query in _hot_queries().items():
+            sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+            if dialect.name == 'sqlite':
+                rows = conn.execute(text('EXPLAIN QUERY PLAN ' + sql)).fetchall()
+                plan = '\n'.join(row[-1] for row in rows)
+                full_scan = any(line.startswith('SCAN ') and 'USING' not in line for line in plan.splitlines())
+            else:
+                rows = conn.execute(text('EXPLAIN ' + sql)).fetchall()
+                plan = '\n'.join(row[0] for row in rows)
+                full_scan = 'Seq Scan' in plan
+            results[label] = (not full_scan, plan)
+        conn.rollback()
+    return results
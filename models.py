@@ -1,7 +1,10 @@
 from app import db
+from flask import g, has_app_context
 from flask_login import UserMixin
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, event, case, update, select, text, inspect
+from sqlalchemy.orm import Session, object_session
+from identity import mark_identity_stale
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,6 +18,22 @@ class User(UserMixin, db.Model):
     is_public = db.Column(db.Boolean, default=True)
     is_admin = db.Column(db.Boolean, default=False)
     unread_notifications = db.Column(db.Integer, default=0)
+    # Denormalized rating aggregates, maintained on Feedback insert
+    rating_sum = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Histogram of received ratings, and the average stored for sorting/filtering
+    rating_1 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_2 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_3 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_4 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_5 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_avg = db.Column(db.Float, default=0, server_default='0', nullable=False)
+    # Newest AdminMessage id this user has seen; everything above it is unread
+    last_seen_message_id = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped whenever anything shown on the public profile changes (fields,
+    # skills, rating); pages and caches use them as validators
+    version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    profile_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -25,29 +44,92 @@ class User(UserMixin, db.Model):
     given_feedback = db.relationship('Feedback', foreign_keys='Feedback.from_user_id', backref='from_user', lazy=True)
     received_feedback = db.relationship('Feedback', foreign_keys='Feedback.to_user_id', backref='to_user', lazy=True)
     
+    __table_args__ = (
+        # Browse and admin user listings page on (created_at, id)
+        db.Index('ix_user_created_at', 'created_at', 'id'),
+        db.Index('ix_user_is_admin_created_at', 'is_admin', 'created_at', 'id'),
+        db.Index('ix_user_profile_updated_at', 'profile_updated_at'),
+        # Browse sorted by rating pages on (rating_avg, id)
+        db.Index('ix_user_rating_avg', 'rating_avg', 'id'),
+    )
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
     @property
     def average_rating(self):
-        ratings = [f.rating for f in self.received_feedback if f.rating]
-        return round(sum(ratings) / len(ratings), 1) if ratings else 0
+        return round(self.rating_sum / self.rating_count, 1) if self.rating_count else 0
     
     @property
     def review_count(self):
-        return len(self.received_feedback)
+        return self.rating_count or 0
+    
+    @property
+    def rating_histogram(self):
+        # [(stars, count, percent of reviews)], 5 stars first
+        return [(stars, getattr(self, f'rating_{stars}') or 0,
+                 round(100 * (getattr(self, f'rating_{stars}') or 0) / self.rating_count) if self.rating_count else 0)
+                for stars in range(5, 0, -1)]
+    
+    @staticmethod
+    def increment_notifications(user_id, by=1):
+        # Atomic SQL-side increment; returns the new count
+        stmt = update(User).where(User.id == user_id).values(
+            unread_notifications=func.coalesce(User.unread_notifications, 0) + by
+        ).execution_options(synchronize_session=False)
+        mark_identity_stale(db.session(), user_id)
+        if db.engine.dialect.update_returning:
+            return db.session.execute(stmt.returning(User.unread_notifications)).scalar()
+        db.session.execute(stmt)
+        return db.session.execute(select(User.unread_notifications).where(User.id == user_id)).scalar()
+    
+    @staticmethod
+    def mark_notifications_read(user_ids):
+        # Bulk reset; rows that are already at zero are not written
+        for user_id in user_ids:
+            mark_identity_stale(db.session(), user_id)
+        result = db.session.execute(
+            update(User).where(User.id.in_(user_ids), User.unread_notifications != 0)
+            .values(unread_notifications=0)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    def get_swap_counts(self):
+        # {status: {'sent': n, 'received': n}} from one grouped aggregate per table,
+        # memoized for the rest of the request
+        memo = g.setdefault('swap_counts', {}) if has_app_context() else {}
+        if self.id not in memo:
+            counts = {}
+            # Archived swaps still count towards a member's history
+            for model in (SwapRequest, SwapRequestArchive):
+                rows = db.session.query(
+                    model.status,
+                    func.sum(case((model.requester_id == self.id, 1), else_=0)),
+                    func.sum(case((model.requested_id == self.id, 1), else_=0))
+                ).filter(
+                    (model.requester_id == self.id) | (model.requested_id == self.id)
+                ).group_by(model.status).all()
+                for status, sent, received in rows:
+                    entry = counts.setdefault(status, {'sent': 0, 'received': 0})
+                    entry['sent'] += sent or 0
+                    entry['received'] += received or 0
+            memo[self.id] = counts
+        return memo[self.id]
+    
+    def _count_swaps(self, status, sides=('sent', 'received')):
+        counts = self.get_swap_counts().get(status, {})
+        return sum(counts.get(side, 0) for side in sides)
     
     def get_active_swaps(self):
-        return SwapRequest.query.filter_by(requester_id=self.id, status='accepted').count() + \
-               SwapRequest.query.filter_by(requested_id=self.id, status='accepted').count()
+        return self._count_swaps('accepted')
     
     def get_pending_requests(self):
-        return SwapRequest.query.filter_by(requested_id=self.id, status='pending').count()
+        return self._count_swaps('pending', sides=('received',))
     
     def get_completed_swaps(self):
-        return SwapRequest.query.filter_by(requester_id=self.id, status='completed').count() + \
-               SwapRequest.query.filter_by(requested_id=self.id, status='completed').count()
+        return self._count_swaps('completed')
 
 class Skill(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -55,6 +137,11 @@ class Skill(db.Model):
     category = db.Column(db.String(50))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_skill_user_id', 'user_id'),
+        db.Index('ix_skill_category_user_id', 'category', 'user_id'),
+    )
 
 class SkillWanted(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -62,6 +149,11 @@ class SkillWanted(db.Model):
     category = db.Column(db.String(50))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_skill_wanted_user_id', 'user_id'),
+        db.Index('ix_skill_wanted_category_user_id', 'category', 'user_id'),
+    )
 
 class SwapRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -73,19 +165,136 @@ class SwapRequest(db.Model):
     message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Per-user lookups filter one side plus status, then order by time
+        db.Index('ix_swap_request_requester_status', 'requester_id', 'status', 'updated_at'),
+        db.Index('ix_swap_request_requested_status', 'requested_id', 'status', 'updated_at'),
+        db.Index('ix_swap_request_status_created_at', 'status', 'created_at'),
+        db.Index('ix_swap_request_created_at', 'created_at', 'id'),
+        # Archived swaps keep their ids, so SQLite must never reuse one
+        # (without AUTOINCREMENT it hands out max(id) + 1 again)
+        {'sqlite_autoincrement': True},
+    )
+
+# Finished swaps older than ARCHIVE_AFTER_DAYS are moved here, keeping their ids
+ARCHIVABLE_STATUSES = ('completed', 'declined', 'cancelled')
+
+class SwapRequestArchive(db.Model):
+    __tablename__ = 'swap_request_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    requester_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    requested_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    skill_offered = db.Column(db.String(100), nullable=False)
+    skill_wanted = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    requester = db.relationship('User', foreign_keys=[requester_id])
+    requested = db.relationship('User', foreign_keys=[requested_id])
+    
+    __table_args__ = (
+        db.Index('ix_swap_request_archive_requester_status', 'requester_id', 'status', 'updated_at'),
+        db.Index('ix_swap_request_archive_requested_status', 'requested_id', 'status', 'updated_at'),
+    )
+    
+    @staticmethod
+    def find(swap_id):
+        # A swap by id, live or archived
+        return db.session.get(SwapRequest, swap_id) or db.session.get(SwapRequestArchive, swap_id)
 
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     from_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     to_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    swap_request_id = db.Column(db.Integer, db.ForeignKey('swap_request.id'), nullable=False)
+    # No foreign key: the swap may live in swap_request or swap_request_archive
+    swap_request_id = db.Column(db.Integer, nullable=False)
     rating = db.Column(db.Integer, nullable=False)  # 1-5 stars
     comment = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_feedback_swap_request_to_user', 'swap_request_id', 'to_user_id'),
+        db.Index('ix_feedback_from_to_swap_request', 'from_user_id', 'to_user_id', 'swap_request_id'),
+        db.Index('ix_feedback_to_user_id', 'to_user_id'),
+    )
 
 class AdminMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
\ No newline at end of file
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    __table_args__ = (
+        # The message feed pages on (created_at, id)
+        db.Index('ix_admin_message_created_at', 'created_at', 'id'),
+    )
+
+class Job(db.Model):
+    # Background work queued by request handlers, run by jobs.work()
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    idempotency_key = db.Column(db.String(200))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Workers claim the oldest due job
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+        # At most one outstanding job per idempotency key
+        db.Index('uq_job_idempotency_key_outstanding', 'idempotency_key', unique=True,
+                 sqlite_where=text("status IN ('queued', 'running')"),
+                 postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+@event.listens_for(Feedback, 'after_insert')
+def update_rating_aggregates(mapper, connection, target):
+    # Keep the User rating aggregates in step with the feedback table, in the
+    # same transaction as the insert; the right-hand sides see the old row
+    users = User.__table__
+    bucket = users.c[f'rating_{target.rating}']
+    mark_identity_stale(object_session(target), target.to_user_id)
+    connection.execute(
+        users.update()
+        .where(users.c.id == target.to_user_id)
+        .values({
+            users.c.rating_sum: users.c.rating_sum + target.rating,
+            users.c.rating_count: users.c.rating_count + 1,
+            bucket: bucket + 1,
+            users.c.rating_avg: (users.c.rating_sum + target.rating) * 1.0 / (users.c.rating_count + 1),
+            users.c.version: users.c.version + 1,
+            users.c.profile_updated_at: datetime.utcnow(),
+        })
+    )
+
+# User columns rendered on profiles and browse cards
+PROFILE_FIELDS = ('first_name', 'last_name', 'location', 'profile_photo', 'availability',
+                  'is_public', 'is_admin')
+
+@event.listens_for(Session, 'before_flush')
+def bump_profile_versions(session, flush_context, instances):
+    touched = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Skill, SkillWanted)) and obj.user_id:
+            touched.add(obj.user_id)
+        elif isinstance(obj, User) and obj.id and obj not in session.new:
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in PROFILE_FIELDS):
+                touched.add(obj.id)
+    for user_id in touched:
+        user = session.get(User, user_id)
+        if user is not None:
+            user.version = User.version + 1
+            user.profile_updated_at = datetime.utcnow()
+            mark_identity_stale(session, user_id)
@@ -0,0 +1,160 @@
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, delete, insert, literal, DateTime
+from app import db
+from cache import get_cache
+from identity import mark_identity_stale
+from matching import mark_users_stale
+from models import User, SwapRequest, SwapRequestArchive, ARCHIVABLE_STATUSES
+from stats import invalidate_admin_stats
+
+# Bulk moderation. Each operation walks the primary keys of the rows it
+# targets in batches (a keyset range scan), applies one set-based UPDATE or
+# DELETE per batch that re-checks its predicate, so rows changed in the
+# meantime are skipped, and commits. Locks are therefore held for one batch
+# at a time and the operation can be interrupted and simply re-run.
+# Progress is reported after every batch and the latest report is kept in
+# the cache for the admin pages. Archiving runs the same way, so it is safe
+# to schedule while the site is serving traffic.
+CANCELLABLE = ('pending', 'accepted')
+PURGEABLE = ('declined', 'cancelled')  # never have feedback attached
+REPORT_KEY = 'moderation:last'
+REPORT_TTL = 24 * 3600
+
+def last_report():
+    return get_cache('moderation').get(REPORT_KEY)
+
+def _run(operation, id_column, where, apply, batch_size=None, progress=None):
+    batch_size = batch_size or current_app.config['JOB_BATCH_SIZE']
+    cache = get_cache('moderation')
+    report = {'operation': operation, 'rows': 0, 'batches': 0, 'seconds': 0.0, 'rate': 0.0,
+              'done': False, 'started_at': datetime.utcnow()}
+    started = time.perf_counter()
+    last_id = 0
+    while True:
+        ids = db.session.execute(
+            select(id_column).where(where, id_column > last_id).order_by(id_column).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        report['rows'] += apply(ids)
+        db.session.commit()
+        last_id = ids[-1]
+        report['batches'] += 1
+        report['seconds'] = time.perf_counter() - started
+        report['rate'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+        cache.set(REPORT_KEY, dict(report), ttl=REPORT_TTL)
+        if progress:
+            progress(report)
+    report['done'] = True
+    cache.set(REPORT_KEY, report, ttl=REPORT_TTL)
+    invalidate_admin_stats()
+    return report
+
+def users_where(user_ids=None, email_like=None):
+    # Admins are never matched
+    where = User.is_admin == False
+    if user_ids:
+        where &= User.id.in_(user_ids)
+    if email_like:
+        where &= User.email.like(email_like)
+    return where
+
+def _set_visibility(ids, is_public):
+    changed = db.session.execute(
+        update(User).where(User.id.in_(ids), User.is_admin == False, User.is_public != is_public)
+        .values(is_public=is_public, version=User.version + 1, profile_updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    for user_id in ids:
+        mark_identity_stale(db.session(), user_id)
+    mark_users_stale(db.session(), ids)
+    return changed
+
+def ban_users(user_ids=None, email_like=None, batch_size=None, progress=None):
+    # Hide the profiles and cancel their pending requests, batch by batch
+    def apply(ids):
+        changed = _set_visibility(ids, False)
+        db.session.execute(
+            update(SwapRequest).where(
+                (SwapRequest.requester_id.in_(ids)) | (SwapRequest.requested_id.in_(ids)),
+                SwapRequest.status == 'pending'
+            ).values(status='cancelled', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        return changed
+    if not (user_ids or email_like):
+        raise ValueError('Give user ids or an email pattern')
+    return _run('ban users', User.id, users_where(user_ids, email_like), apply, batch_size, progress)
+
+def unban_users(user_ids=None, email_like=None, batch_size=None, progress=None):
+    if not (user_ids or email_like):
+        raise ValueError('Give user ids or an email pattern')
+    return _run('unban users', User.id, users_where(user_ids, email_like),
+                lambda ids: _set_visibility(ids, True), batch_size, progress)
+
+def cancel_swaps(status='pending', older_than_days=30, batch_size=None, progress=None):
+    if status not in CANCELLABLE:
+        raise ValueError(f'Only {", ".join(CANCELLABLE)} swaps can be cancelled')
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    where = (SwapRequest.status == status) & (SwapRequest.created_at < cutoff)
+    def apply(ids):
+        return db.session.execute(
+            update(SwapRequest).where(SwapRequest.id.in_(ids), where)
+            .values(status='cancelled', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    return _run(f'cancel {status} swaps', SwapRequest.id, where, apply, batch_size, progress)
+
+def purge_swaps(statuses=PURGEABLE, older_than_days=90, batch_size=None, progress=None):
+    if not statuses or set(statuses) - set(PURGEABLE):
+        raise ValueError(f'Only {", ".join(PURGEABLE)} swaps can be deleted')
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    where = SwapRequest.status.in_(statuses) & (SwapRequest.updated_at < cutoff)
+    def apply(ids):
+        return db.session.execute(
+            delete(SwapRequest).where(SwapRequest.id.in_(ids), where)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    return _run(f'delete {"/".join(statuses)} swaps', SwapRequest.id, where, apply, batch_size, progress)
+
+def archive_swaps(older_than_days=None, batch_size=None, progress=None):
+    # Move finished swaps into swap_request_archive. Ids are kept, so feedback
+    # still points at its swap (swap_request ids are never reused); each batch
+    # is copied and deleted in one transaction, so a stopped run leaves
+    # nothing half-moved
+    days = older_than_days or current_app.config['ARCHIVE_AFTER_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    where = SwapRequest.status.in_(ARCHIVABLE_STATUSES) & (SwapRequest.updated_at < cutoff)
+    live = SwapRequest.__table__
+    archive = SwapRequestArchive.__table__
+    def apply(ids):
+        moving = db.session.execute(select(live.c.id).where(live.c.id.in_(ids), where)).scalars().all()
+        # A live id that is already archived is a different swap: never
+        # overwrite or delete it, stop and leave it for an admin
+        taken = db.session.execute(select(archive.c.id).where(archive.c.id.in_(moving))).scalars().all()
+        if taken:
+            db.session.rollback()
+            raise RuntimeError(f'swap ids already archived: {", ".join(map(str, sorted(taken)))}')
+        copied = db.session.execute(insert(archive).from_select(
+            [column.name for column in live.columns] + ['archived_at'],
+            select(*live.columns, literal(datetime.utcnow(), DateTime)).where(live.c.id.in_(moving))
+        )).rowcount
+        deleted = db.session.execute(
+            delete(SwapRequest).where(SwapRequest.id.in_(moving))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if copied != deleted:
+            db.session.rollback()
+            raise RuntimeError(f'copied {copied} swaps but deleted {deleted}')
+        return deleted
+    return _run('archive finished swaps', SwapRequest.id, where, apply, batch_size, progress)
+
+OPERATIONS = {
+    'ban_users': ban_users,
+    'unban_users': unban_users,
+    'cancel_swaps': cancel_swaps,
+    'purge_swaps': purge_swaps,
+    'archive_swaps': archive_swaps,
+}
@@ -0,0 +1,210 @@
+import asyncio
+import glob
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from flask import current_app
+
+# Pub/sub fan-out for the notification stream. Each worker keeps its own
+# subscriber queues; the backend decides how a publish reaches the other
+# workers:
+#   memory              - single process only (development server)
+#   local[:/some/dir]   - Unix datagram sockets, one per worker, on this host
+#   redis://host:6379/0 - Redis pub/sub (requires the redis package)
+
+class MemoryBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id, subscriber=None):
+        # Anything with put_nowait() that raises queue.Full when full
+        subscriber = subscriber or queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, payload):
+        self._deliver(user_id, payload)
+
+    def _deliver(self, user_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # A stalled client only ever needs the latest count
+                pass
+
+class LocalSocketBroker(MemoryBroker):
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self._socket = None
+        self._pid = None
+
+    def subscribe(self, user_id, subscriber=None):
+        self._ensure_listener()
+        return super().subscribe(user_id, subscriber)
+
+    def _ensure_listener(self):
+        # Bound lazily so each forked worker gets its own socket
+        with self._lock:
+            if self._socket is not None and self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{os.getpid()}.sock')
+            if os.path.exists(path):
+                os.unlink(path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            self._socket, self._pid = sock, os.getpid()
+        threading.Thread(target=self._listen, args=(sock,), daemon=True).start()
+
+    def _listen(self, sock):
+        while True:
+            try:
+                message = json.loads(sock.recv(65536))
+            except (OSError, ValueError):
+                continue
+            self._deliver(message['user_id'], message['payload'])
+
+    def publish(self, user_id, payload):
+        message = json.dumps({'user_id': user_id, 'payload': payload}).encode()
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for path in glob.glob(os.path.join(self.directory, '*.sock')):
+                try:
+                    sender.sendto(message, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Socket left behind by a worker that has exited
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except OSError:
+                    pass
+        finally:
+            sender.close()
+
+class RedisBroker(MemoryBroker):
+    channel_prefix = 'skillswap:notifications:'
+
+    def __init__(self, url):
+        super().__init__()
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._listening_pid = None
+
+    def subscribe(self, user_id, subscriber=None):
+        with self._lock:
+            start = self._listening_pid != os.getpid()
+            self._listening_pid = os.getpid()
+        if start:
+            threading.Thread(target=self._listen, daemon=True).start()
+        return super().subscribe(user_id, subscriber)
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.channel_prefix + '*')
+        for message in pubsub.listen():
+            user_id = int(message['channel'].decode().rsplit(':', 1)[1])
+            self._deliver(user_id, json.loads(message['data']))
+
+    def publish(self, user_id, payload):
+        self._redis.publish(f'{self.channel_prefix}{user_id}', json.dumps(payload))
+
+def create_broker(spec):
+    if spec.startswith('redis://') or spec.startswith('rediss://'):
+        return RedisBroker(spec)
+    if spec.startswith('local'):
+        _, _, directory = spec.partition(':')
+        return LocalSocketBroker(directory or '/tmp/skillswap-notifications')
+    return MemoryBroker()
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = create_broker(current_app.config['NOTIFICATION_BROKER'])
+    return _broker
+
+def notify(user_id, unread_count):
+    # Call after the commit that changed the count
+    get_broker().publish(user_id, {'unread_count': unread_count})
+
+class AsyncSubscriber:
+    # Bridges deliveries, which happen on request or listener threads, onto
+    # an asyncio queue owned by the event loop serving the stream
+    def __init__(self, loop, maxsize=100):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put_nowait(self, payload):
+        self.loop.call_soon_threadsafe(self._put, payload)
+
+    def _put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            pass
+
+def _event(payload):
+    return f'data: {json.dumps(payload)}\n\n'
+
+def event_stream(broker, user_id, unread_count, lifetime=300, heartbeat=15):
+    # Server-sent events for one client. The stream closes after `lifetime`
+    # seconds and EventSource reconnects, so no worker is held indefinitely.
+    subscriber = broker.subscribe(user_id)
+    try:
+        yield 'retry: 5000\n'
+        yield _event({'unread_count': unread_count})
+        deadline = time.monotonic() + lifetime
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                payload = subscriber.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield _event(payload)
+    finally:
+        broker.unsubscribe(user_id, subscriber)
+
+async def async_event_stream(broker, user_id, unread_count, lifetime=300, heartbeat=15):
+    # event_stream for the ASGI entry point: waiting holds no thread, so one
+    # process can keep thousands of clients connected
+    subscriber = broker.subscribe(user_id, AsyncSubscriber(asyncio.get_running_loop()))
+    try:
+        yield 'retry: 5000\n'
+        yield _event({'unread_count': unread_count})
+        deadline = time.monotonic() + lifetime
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                payload = await asyncio.wait_for(subscriber.queue.get(), timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield _event(payload)
+    finally:
+        broker.unsubscribe(user_id, subscriber)
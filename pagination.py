@@ -0,0 +1,81 @@
+import base64
+import json
+import math
+from datetime import datetime
+from flask import request, url_for
+from sqlalchemy import DateTime, and_, or_
+
+# Keyset (cursor) pagination over a (sort key, id) pair. Cursors are opaque
+# url-safe tokens holding the last row's sort key and id, so fetching a page
+# costs an index range scan no matter how deep into the result set it is.
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def get_page_size(default=DEFAULT_PAGE_SIZE):
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit or default, MAX_PAGE_SIZE))
+
+def encode_cursor(key, row_id):
+    if isinstance(key, datetime):
+        payload = {'t': key.isoformat(), 'id': row_id}
+    else:
+        payload = {'k': key, 'id': row_id}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, key_column):
+    # Malformed or tampered cursors are treated as "start from the beginning":
+    # the key must suit the sort column (an ISO datetime for DateTime columns,
+    # a finite number otherwise) and the id must be an integer
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        row_id = payload['id']
+        if isinstance(key_column.type, DateTime):
+            key = datetime.fromisoformat(payload['t'])
+        else:
+            key = payload['k']
+            if isinstance(key, bool) or not isinstance(key, (int, float)) or not math.isfinite(key):
+                return None
+    except (ValueError, KeyError, TypeError):
+        return None
+    if isinstance(row_id, bool) or not isinstance(row_id, int):
+        return None
+    return key, row_id
+
+def keyset_page(query, key_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True, key_getter=None):
+    # Returns (rows, next_cursor); next_cursor is None on the last page
+    position = decode_cursor(cursor, key_column)
+    if position:
+        key, row_id = position
+        if descending:
+            query = query.filter(or_(key_column < key, and_(key_column == key, id_column < row_id)))
+        else:
+            query = query.filter(or_(key_column > key, and_(key_column == key, id_column > row_id)))
+
+    if descending:
+        query = query.order_by(key_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(key_column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if key_getter:
+            next_cursor = encode_cursor(*key_getter(last))
+        else:
+            next_cursor = encode_cursor(getattr(last, key_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+def next_page_url(cursor=None):
+    # Current URL with its query string preserved and the cursor swapped in;
+    # without a cursor this links back to the first page
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    if cursor:
+        args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,242 @@
+import bisect
+import cProfile
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import deque, defaultdict
+from contextvars import ContextVar
+from flask import request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request profiling. PerfMiddleware wraps the WSGI app and times each
+# request end to end, including streaming the body; SQLAlchemy engine events
+# and Flask's template signals add query counts, SQL time and template time
+# to the request being recorded. Recent requests are kept in a bounded ring
+# buffer for percentiles, and cumulative per-endpoint histograms back the
+# Prometheus endpoint. A sampled fraction of requests runs under cProfile
+# and the stats of the slow ones are kept. Everything is per process.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED = '<unmatched>'
+
+_current = ContextVar('perf_request', default=None)
+
+class EndpointHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.bytes = 0
+
+    def observe(self, sample):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, sample['duration'])] += 1
+        self.count += 1
+        self.sum += sample['duration']
+        self.sql_count += sample['sql_count']
+        self.sql_time += sample['sql_time']
+        self.bytes += sample['bytes']
+
+class PerfRecorder:
+    def __init__(self, buffer_size=2000, profile_slots=20):
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=buffer_size)
+        self.profiles = deque(maxlen=profile_slots)
+        self.histograms = defaultdict(EndpointHistogram)
+        self._profile_ids = itertools.count(1)
+
+    def record(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+            self.histograms[(sample['endpoint'], sample['method'])].observe(sample)
+
+    def keep_profile(self, sample, profiler):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+        with self.lock:
+            profile_id = next(self._profile_ids)
+            self.profiles.append(dict(sample, id=profile_id, stats=out.getvalue()))
+        return profile_id
+
+    def get_profile(self, profile_id):
+        with self.lock:
+            return next((p for p in self.profiles if p['id'] == profile_id), None)
+
+    def summary(self):
+        # Per-endpoint percentiles over the ring buffer, slowest p95 first
+        with self.lock:
+            samples = list(self.samples)
+        grouped = defaultdict(list)
+        for sample in samples:
+            grouped[(sample['endpoint'], sample['method'])].append(sample)
+        rows = []
+        for (endpoint, method), group in grouped.items():
+            durations = sorted(s['duration'] for s in group)
+            n = len(group)
+            rows.append({
+                'endpoint': endpoint,
+                'method': method,
+                'count': n,
+                'p50': _percentile(durations, 50),
+                'p95': _percentile(durations, 95),
+                'p99': _percentile(durations, 99),
+                'max': durations[-1],
+                'sql_count': sum(s['sql_count'] for s in group) / n,
+                'sql_time': sum(s['sql_time'] for s in group) / n,
+                'template_time': sum(s['template_time'] for s in group) / n,
+                'bytes': sum(s['bytes'] for s in group) / n,
+                'errors': sum(1 for s in group if s['status'] >= 500),
+            })
+        rows.sort(key=lambda row: row['p95'], reverse=True)
+        return rows
+
+    def slowest(self, limit=20):
+        with self.lock:
+            samples = list(self.samples)
+        return sorted(samples, key=lambda s: s['duration'], reverse=True)[:limit]
+
+    def prometheus(self):
+        with self.lock:
+            histograms = {key: (list(h.buckets), h.count, h.sum, h.sql_count, h.sql_time, h.bytes)
+                          for key, h in self.histograms.items()}
+        lines = [
+            '# HELP skillswap_request_duration_seconds Request latency by endpoint.',
+            '# TYPE skillswap_request_duration_seconds histogram',
+        ]
+        for (endpoint, method), (buckets, count, total, *_rest) in sorted(histograms.items()):
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f'skillswap_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'skillswap_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'skillswap_request_duration_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'skillswap_request_duration_seconds_count{{{labels}}} {count}')
+        for name, index, kind, help_text in (
+            ('skillswap_sql_queries_total', 3, 'counter', 'SQL statements executed by endpoint.'),
+            ('skillswap_sql_seconds_total', 4, 'counter', 'Time spent in SQL by endpoint.'),
+            ('skillswap_response_bytes_total', 5, 'counter', 'Response body bytes by endpoint.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (endpoint, method), values in sorted(histograms.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}",method="{method}"}} {values[index]}')
+        return '\n'.join(lines) + '\n'
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class PerfMiddleware:
+    def __init__(self, wsgi_app, recorder, config):
+        self.wsgi_app = wsgi_app
+        self.recorder = recorder
+        self.config = config
+
+    def __call__(self, environ, start_response):
+        state = {
+            'endpoint': UNMATCHED, 'sql_count': 0, 'sql_time': 0.0,
+            'template_time': 0.0, 'templates': [], 'status': 500, 'streaming': False,
+        }
+        token = _current.set(state)
+        profiler = None
+        if self.config['PERF_PROFILE_SAMPLE_RATE'] and random.random() < self.config['PERF_PROFILE_SAMPLE_RATE']:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started = time.perf_counter()
+
+        def capture_start_response(status, headers, exc_info=None):
+            state['status'] = int(status.split(' ', 1)[0])
+            state['streaming'] = any(name.lower() == 'content-type' and value.startswith('text/event-stream')
+                                     for name, value in headers)
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, capture_start_response)
+        except Exception:
+            self._finish(state, environ, started, 0, profiler)
+            _current.reset(token)
+            raise
+        _current.reset(token)
+        return self._iterate(body, state, environ, started, profiler)
+
+    def _iterate(self, body, state, environ, started, profiler):
+        size = 0
+        token = _current.set(state)
+        try:
+            for chunk in body:
+                size += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            _current.reset(token)
+            self._finish(state, environ, started, size, profiler)
+
+    def _finish(self, state, environ, started, size, profiler):
+        duration = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        if state['streaming']:
+            # Long-lived event streams would swamp the latency figures
+            return
+        sample = {
+            'endpoint': state['endpoint'],
+            'method': environ.get('REQUEST_METHOD', 'GET'),
+            'path': environ.get('PATH_INFO', ''),
+            'status': state['status'],
+            'duration': duration,
+            'sql_count': state['sql_count'],
+            'sql_time': state['sql_time'],
+            'template_time': state['template_time'],
+            'bytes': size,
+            'at': time.time(),
+        }
+        self.recorder.record(sample)
+        if profiler is not None and duration >= self.config['PERF_SLOW_THRESHOLD']:
+            self.recorder.keep_profile(sample, profiler)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('perf_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = _current.get()
+    started = conn.info.get('perf_started')
+    if state is not None and started:
+        state['sql_count'] += 1
+        state['sql_time'] += time.perf_counter() - started.pop()
+
+def _before_render(app, template, context, **extra):
+    state = _current.get()
+    if state is not None:
+        state['templates'].append(time.perf_counter())
+
+def _after_render(app, template, context, **extra):
+    state = _current.get()
+    if state is not None and state['templates']:
+        started = state['templates'].pop()
+        # Nested renders (includes, fragments) are counted once, by the outermost
+        if not state['templates']:
+            state['template_time'] += time.perf_counter() - started
+
+recorder = None
+
+def init_perf(app):
+    global recorder
+    recorder = PerfRecorder(buffer_size=app.config['PERF_BUFFER_SIZE'])
+    app.wsgi_app = PerfMiddleware(app.wsgi_app, recorder, app.config)
+
+    @app.before_request
+    def _tag_endpoint():
+        state = _current.get()
+        if state is not None:
+            state['endpoint'] = request.endpoint or UNMATCHED
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
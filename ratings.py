@@ -0,0 +1,75 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, func, bindparam
+from app import db
+from identity import forget_identities
+from models import User, Feedback
+
+# Per-user rating aggregates: rating_sum, rating_count, a rating_1..rating_5
+# histogram and rating_avg live on the user row. The Feedback after_insert
+# listener keeps them current in the same transaction as the insert, so the
+# pages never read the feedback table. rebuild_ratings recomputes them from
+# feedback in batches of users, for backfills or after bulk edits that
+# bypassed the ORM, and only writes rows that actually changed.
+STARS = (1, 2, 3, 4, 5)
+BUCKETS = tuple(f'rating_{stars}' for stars in STARS)
+
+def rebuild_batch(conn, ids):
+    # Recompute the aggregates of the given users; returns how many changed
+    users = User.__table__
+    feedback = Feedback.__table__
+    histograms = defaultdict(lambda: dict.fromkeys(STARS, 0))
+    for user_id, rating, count in conn.execute(
+        select(feedback.c.to_user_id, feedback.c.rating, func.count())
+        .where(feedback.c.to_user_id.in_(ids))
+        .group_by(feedback.c.to_user_id, feedback.c.rating)
+    ):
+        if rating in STARS:
+            histograms[user_id][rating] = count
+    changed = []
+    current = conn.execute(
+        select(users.c.id, users.c.rating_sum, users.c.rating_count, users.c.rating_avg,
+               *(users.c[bucket] for bucket in BUCKETS)).where(users.c.id.in_(ids))
+    )
+    for row in current:
+        histogram = histograms.get(row.id) or dict.fromkeys(STARS, 0)
+        count = sum(histogram.values())
+        total = sum(stars * n for stars, n in histogram.items())
+        values = {'rating_sum': total, 'rating_count': count, 'rating_avg': total / count if count else 0.0}
+        values.update((f'rating_{stars}', n) for stars, n in histogram.items())
+        if any(getattr(row, name) != value for name, value in values.items() if name != 'rating_avg') or \
+                abs((row.rating_avg or 0) - values['rating_avg']) > 1e-9:
+            changed.append(dict(values, uid=row.id))
+    if changed:
+        conn.execute(
+            users.update().where(users.c.id == bindparam('uid')).values(
+                {name: bindparam(name) for name in ('rating_sum', 'rating_count', 'rating_avg') + BUCKETS},
+            ).values(version=users.c.version + 1, profile_updated_at=datetime.utcnow()),
+            changed
+        )
+    return [values['uid'] for values in changed]
+
+def rebuild_ratings(batch_size=None, progress=None):
+    # One transaction per batch of users, walking User.id
+    batch_size = batch_size or current_app.config['JOB_BATCH_SIZE']
+    report = {'users': 0, 'changed': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    last_id = 0
+    while True:
+        with db.engine.begin() as conn:
+            ids = conn.execute(
+                select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            changed = rebuild_batch(conn, ids)
+        forget_identities(changed)
+        last_id = ids[-1]
+        report['users'] += len(ids)
+        report['changed'] += len(changed)
+        report['seconds'] = time.perf_counter() - started
+        if progress:
+            progress(report)
+    return report
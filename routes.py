@@ -1,28 +1,51 @@
-import os
-from flask import render_template, request, redirect, url_for, flash, jsonify, current_app
+import hmac
+from functools import partial
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, abort, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from app import app, db
-from models import User, Skill, SkillWanted, SwapRequest, Feedback, AdminMessage
-from forms import LoginForm, RegisterForm, ProfileForm, SkillForm, SwapRequestForm, FeedbackForm, AdminMessageForm, SearchForm
+from sqlalchemy.orm import selectinload, joinedload
+from app import db
+from models import User, Skill, SkillWanted, SwapRequest, SwapRequestArchive, Feedback, AdminMessage
+from search import search_users
+from pagination import keyset_page, get_page_size, next_page_url
+from notifications import notify, get_broker, event_stream
+from serializers import swap_page, completed_swap, active_swap, pending_request
+from stats import admin_stats
+from matching import find_matches, index_stamp, normalize_skill
+from images import save_upload, send_photo, photo_url
+from jobs import enqueue
+import perf
+from database import replica_reads
+from http_cache import conditional, page_stamp, directory_stamp, swaps_stamp
+from fragments import user_cards, profile_summary
+from exports import EXPORTS, FORMATS, export_chunks, gzip_chunks
+from moderation import last_report
+from broadcasts import feed_page, latest_message_id, mark_messages_seen, unread_message_count
+from forms import LoginForm, RegisterForm, ProfileForm, SkillForm, SwapRequestForm, FeedbackForm, AdminMessageForm, SearchForm, BulkUserForm, SwapCleanupForm
 from datetime import datetime
-import uuid
+
+bp = Blueprint('main', __name__)
+
+bp.add_app_template_global(next_page_url)
+bp.add_app_template_filter(normalize_skill)
+bp.add_app_template_global(photo_url)
+bp.add_app_template_global(unread_message_count)
 
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/')
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('auth'))
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.auth'))
 
-@app.route('/auth', methods=['GET', 'POST'])
+@bp.route('/auth', methods=['GET', 'POST'])
 def auth():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     login_form = LoginForm()
     register_form = RegisterForm()
@@ -34,7 +57,7 @@ def auth():
             admin_user = User.query.filter_by(is_admin=True).first()
             if admin_user:
                 login_user(admin_user)
-                return redirect(url_for('admin'))
+                return redirect(url_for('main.admin'))
             else:
                 flash('Admin account not found', 'error')
         else:
@@ -44,7 +67,7 @@ def auth():
         user = User.query.filter_by(email=login_form.email.data).first()
         if user and check_password_hash(user.password_hash, login_form.password.data):
             login_user(user, remember=login_form.remember_me.data)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         flash('Invalid email or password', 'error')
     
     if register_form.validate_on_submit() and 'register' in request.form:
@@ -61,17 +84,17 @@ def auth():
             db.session.add(user)
             db.session.commit()
             login_user(user)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
     
     return render_template('auth.html', login_form=login_form, register_form=register_form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('auth'))
+    return redirect(url_for('main.auth'))
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     # Get recent activity
@@ -85,7 +108,7 @@ def dashboard():
                          recent_requests=recent_requests,
                          completed_swaps=completed_swaps)
 
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     profile_form = ProfileForm(obj=current_user)
@@ -104,19 +127,12 @@ def profile():
             file = profile_form.profile_photo.data
             if file and hasattr(file, 'filename') and file.filename and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
-                # Generate unique filename
-                filename = str(uuid.uuid4()) + '.' + filename.rsplit('.', 1)[1].lower()
-                
-                # Create uploads directory if it doesn't exist
-                upload_dir = os.path.join(current_app.root_path, 'static', 'uploads')
-                os.makedirs(upload_dir, exist_ok=True)
-                
-                file.save(os.path.join(upload_dir, filename))
-                current_user.profile_photo = filename
+                # Stored under a content-hash name; resized variants are built in the background
+                current_user.profile_photo = save_upload(file, filename.rsplit('.', 1)[1].lower())
         
         db.session.commit()
         flash('Profile updated successfully', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     
     if skill_form.validate_on_submit() and 'add_skill' in request.form:
         skill_type = request.form.get('skill_type')
@@ -128,13 +144,14 @@ def profile():
         db.session.add(skill)
         db.session.commit()
         flash('Skill added successfully', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     
     return render_template('profile.html', 
                          profile_form=profile_form, 
-                         skill_form=skill_form)
+                         skill_form=skill_form,
+                         summary=profile_summary(current_user))
 
-@app.route('/remove_skill/<skill_type>/<int:skill_id>')
+@bp.route('/remove_skill/<skill_type>/<int:skill_id>')
 @login_required
 def remove_skill(skill_type, skill_id):
     if skill_type == 'offered':
@@ -147,35 +164,31 @@ def remove_skill(skill_type, skill_id):
         db.session.commit()
         flash('Skill removed successfully', 'success')
     
-    return redirect(url_for('profile'))
+    return redirect(url_for('main.profile'))
+
+def _browse_stamp():
+    return page_stamp() + (directory_stamp(),)
 
-@app.route('/browse')
+@bp.route('/browse')
+@replica_reads
 @login_required
+@conditional(_browse_stamp)
 def browse():
     search_form = SearchForm()
     
     # Get search parameters
     search_query = request.args.get('search_query', '')
     category = request.args.get('category', '')
+    sort = request.args.get('sort', '')
+    min_rating = request.args.get('min_rating', type=float)
     
     # Build query - exclude admins and current user
     query = User.query.filter(User.id != current_user.id, User.is_public == True, User.is_admin == False)
     
+    rank = None
     if search_query:
-        # Search in skills offered
-        skill_users = db.session.query(User.id).join(Skill).filter(
-            Skill.name.ilike(f'%{search_query}%')
-        ).subquery()
-        
-        # Search in skills wanted
-        skill_wanted_users = db.session.query(User.id).join(SkillWanted).filter(
-            SkillWanted.name.ilike(f'%{search_query}%')
-        ).subquery()
-        
-        query = query.filter(
-            (User.id.in_(db.session.query(skill_users.c.id))) | 
-            (User.id.in_(db.session.query(skill_wanted_users.c.id)))
-        )
+        # Full-text search over skill names and categories, ranked by relevance
+        query, rank = search_users(query, search_query)
     
     if category:
         # Filter by category in skills offered or wanted
@@ -192,26 +205,66 @@ def browse():
             (User.id.in_(db.session.query(skill_wanted_users.c.id)))
         )
     
-    users = query.all()
+    if min_rating:
+        # Stored average, so no join against feedback
+        query = query.filter(User.rating_avg >= min_rating)
+    
+    cursor = request.args.get('cursor')
+    if sort == 'rating':
+        # Best rated first, also within search results
+        users, next_cursor = keyset_page(query, User.rating_avg, User.id, cursor=cursor, limit=get_page_size())
+    elif rank is not None:
+        rows, next_cursor = keyset_page(query.add_columns(rank.label('search_rank')), rank, User.id,
+                                        cursor=cursor, limit=get_page_size(), descending=False,
+                                        key_getter=lambda row: (row.search_rank, row.User.id))
+        users = [row.User for row in rows]
+    else:
+        users, next_cursor = keyset_page(query, User.created_at, User.id, cursor=cursor, limit=get_page_size())
     
-    return render_template('browse.html', users=users, search_form=search_form)
+    # Cards come from the fragment cache; skills are only loaded for misses
+    return render_template('browse.html', users=users, cards=user_cards(users),
+                         search_form=search_form, next_cursor=next_cursor, min_rating=min_rating)
 
-@app.route('/user/<int:user_id>')
+@bp.route('/matches')
 @login_required
+def matches():
+    # Reciprocal skill matches, best first
+    results = find_matches(current_user.id, k=get_page_size())
+    users = User.query.filter(User.id.in_([user_id for _, user_id, _ in results])).options(
+        selectinload(User.skills_offered),
+        selectinload(User.skills_wanted)
+    ).all()
+    users_by_id = {user.id: user for user in users}
+    matches = [(users_by_id[user_id], details) for _, user_id, details in results if user_id in users_by_id]
+    
+    return render_template('matches.html', matches=matches)
+
+def _view_user_stamp(user_id):
+    # Loads the user into the session, so the view's own lookup is free
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    return page_stamp() + (user.version,)
+
+@bp.route('/user/<int:user_id>')
+@replica_reads
+@login_required
+@conditional(_view_user_stamp)
 def view_user(user_id):
     user = User.query.get_or_404(user_id)
     if not user.is_public and user.id != current_user.id:
         flash('This profile is private', 'error')
-        return redirect(url_for('browse'))
+        return redirect(url_for('main.browse'))
     
     # Get potential swap options
     swap_form = SwapRequestForm()
     swap_form.skill_offered.choices = [(s.name, s.name) for s in current_user.skills_offered]
     swap_form.skill_wanted.choices = [(s.name, s.name) for s in user.skills_offered]
     
-    return render_template('profile.html', user=user, swap_form=swap_form, viewing_other=True)
+    return render_template('profile.html', user=user, summary=profile_summary(user),
+                         swap_form=swap_form, viewing_other=True)
 
-@app.route('/send_request/<int:user_id>', methods=['POST'])
+@bp.route('/send_request/<int:user_id>', methods=['POST'])
 @login_required
 def send_request(user_id):
     user = User.query.get_or_404(user_id)
@@ -239,93 +292,99 @@ def send_request(user_id):
             message=message
         )
         
-        # Increment notification count for the requested user
-        user.unread_notifications = (user.unread_notifications or 0) + 1
-        
         db.session.add(swap_request)
+        # Increment notification count for the requested user
+        unread_count = User.increment_notifications(user.id)
         db.session.commit()
+        notify(user.id, unread_count)
         flash('Swap request sent successfully', 'success')
     
-    return redirect(url_for('view_user', user_id=user_id))
+    return redirect(url_for('main.view_user', user_id=user_id))
 
-@app.route('/requests')
+@bp.route('/requests')
 @login_required
 def requests():
     received_requests = SwapRequest.query.filter_by(requested_id=current_user.id, status='pending').all()
     sent_requests = SwapRequest.query.filter_by(requester_id=current_user.id).all()
     
     # Mark notifications as read when viewing requests
-    current_user.unread_notifications = 0
-    db.session.commit()
+    if current_user.unread_notifications and User.mark_notifications_read([current_user.id]):
+        db.session.commit()
+        notify(current_user.id, 0)
     
     return render_template('dashboard.html', 
                          received_requests=received_requests,
                          sent_requests=sent_requests,
                          show_requests=True)
 
-@app.route('/handle_request/<int:request_id>/<action>')
+@bp.route('/handle_request/<int:request_id>/<action>')
 @login_required
 def handle_request(request_id, action):
     swap_request = SwapRequest.query.get_or_404(request_id)
     
     if swap_request.requested_id != current_user.id:
         flash('Unauthorized action', 'error')
-        return redirect(url_for('requests'))
+        return redirect(url_for('main.requests'))
     
     if action == 'accept':
         swap_request.status = 'accepted'
         flash('Request accepted', 'success')
-        # Notify requester
-        requester = User.query.get(swap_request.requester_id)
-        requester.unread_notifications = (requester.unread_notifications or 0) + 1
     elif action == 'decline':
         swap_request.status = 'declined'
         flash('Request declined', 'info')
-        # Notify requester
-        requester = User.query.get(swap_request.requester_id)
-        requester.unread_notifications = (requester.unread_notifications or 0) + 1
+    
+    if action in ('accept', 'decline'):
+        # Notify requester in the background
+        enqueue('notify_user', key=f'swap:{swap_request.id}:{swap_request.status}',
+                user_id=swap_request.requester_id)
     
     swap_request.updated_at = datetime.utcnow()
     db.session.commit()
     
-    return redirect(url_for('requests'))
+    return redirect(url_for('main.requests'))
 
-@app.route('/cancel_request/<int:request_id>')
+@bp.route('/cancel_request/<int:request_id>')
 @login_required
 def cancel_request(request_id):
     swap_request = SwapRequest.query.get_or_404(request_id)
     
     if swap_request.requester_id != current_user.id:
         flash('Unauthorized action', 'error')
-        return redirect(url_for('requests'))
+        return redirect(url_for('main.requests'))
     
     if swap_request.status == 'pending':
         db.session.delete(swap_request)
         db.session.commit()
         flash('Request cancelled', 'info')
     
-    return redirect(url_for('requests'))
+    return redirect(url_for('main.requests'))
 
-@app.route('/complete_swap/<int:request_id>')
+@bp.route('/complete_swap/<int:request_id>')
 @login_required
 def complete_swap(request_id):
     swap_request = SwapRequest.query.get_or_404(request_id)
     
     if swap_request.requester_id != current_user.id and swap_request.requested_id != current_user.id:
         flash('Unauthorized action', 'error')
-        return redirect(url_for('requests'))
+        return redirect(url_for('main.requests'))
     
     swap_request.status = 'completed'
     swap_request.updated_at = datetime.utcnow()
+    # Let the other side know feedback is open
+    other_id = swap_request.requested_id if swap_request.requester_id == current_user.id else swap_request.requester_id
+    enqueue('notify_user', key=f'swap:{swap_request.id}:completed', user_id=other_id)
     db.session.commit()
     
     flash('Swap marked as completed', 'success')
-    return redirect(url_for('feedback', request_id=request_id))
+    return redirect(url_for('main.feedback', request_id=request_id))
 
-@app.route('/feedback/<int:request_id>', methods=['GET', 'POST'])
+@bp.route('/feedback/<int:request_id>', methods=['GET', 'POST'])
 @login_required
 def feedback(request_id):
-    swap_request = SwapRequest.query.get_or_404(request_id)
+    # Old finished swaps may already have been archived
+    swap_request = SwapRequestArchive.find(request_id)
+    if swap_request is None:
+        abort(404)
     
     # Determine who to give feedback to
     if swap_request.requester_id == current_user.id:
@@ -334,7 +393,7 @@ def feedback(request_id):
         feedback_to = swap_request.requester
     else:
         flash('Unauthorized action', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     # Check if feedback already given
     existing_feedback = Feedback.query.filter_by(
@@ -345,7 +404,7 @@ def feedback(request_id):
     
     if existing_feedback:
         flash('You have already provided feedback for this swap', 'info')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     form = FeedbackForm()
     
@@ -360,66 +419,59 @@ def feedback(request_id):
         db.session.add(feedback_obj)
         db.session.commit()
         flash('Feedback submitted successfully', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('feedback.html', form=form, swap_request=swap_request, feedback_to=feedback_to)
 
-@app.route('/admin')
+@bp.route('/admin')
 @login_required
 def admin():
     if not current_user.is_admin:
         flash('Access denied', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
-    # Get statistics
-    total_users = User.query.count()
-    total_swaps = SwapRequest.query.count()
-    active_swaps = SwapRequest.query.filter_by(status='accepted').count()
-    pending_requests = SwapRequest.query.filter_by(status='pending').count()
-    completed_swaps = SwapRequest.query.filter_by(status='completed').count()
+    # Get statistics (cached for a few seconds)
+    stats = admin_stats()
     
-    # Get recent activity
-    recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
-    recent_swaps = SwapRequest.query.order_by(SwapRequest.created_at.desc()).limit(10).all()
-    recent_feedback = Feedback.query.order_by(Feedback.created_at.desc()).limit(10).all()
+    # Get recent activity - index range scans, requester joined in
+    recent_users = User.query.order_by(User.created_at.desc(), User.id.desc()).limit(10).all()
+    recent_swaps = SwapRequest.query.options(joinedload(SwapRequest.requester)).order_by(
+        SwapRequest.created_at.desc(), SwapRequest.id.desc()).limit(10).all()
     
     return render_template('admin_dashboard.html',
-                         total_users=total_users,
-                         total_skills=total_swaps,
-                         pending_requests=pending_requests,
-                         completed_swaps=completed_swaps,
+                         total_users=stats['total_users'],
+                         total_skills=stats['total_swaps'],
+                         active_swaps=stats['active_swaps'],
+                         pending_requests=stats['pending_requests'],
+                         completed_swaps=stats['completed_swaps'],
                          recent_users=recent_users,
                          recent_requests=recent_swaps)
 
-@app.route('/admin/ban_user/<int:user_id>')
+@bp.route('/admin/ban_user/<int:user_id>')
 @login_required
 def ban_user(user_id):
     if not current_user.is_admin:
         flash('Access denied', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     user = User.query.get_or_404(user_id)
     if user.is_admin:
         flash('Cannot ban admin user', 'error')
     else:
-        # Cancel all pending requests
-        SwapRequest.query.filter(
-            (SwapRequest.requester_id == user_id) | (SwapRequest.requested_id == user_id)
-        ).filter_by(status='pending').update({'status': 'cancelled'})
-        
-        # Set profile to private
+        # Set profile to private; pending requests are cancelled in the background
         user.is_public = False
+        enqueue('cancel_pending_swaps', key=f'ban:{user_id}', user_id=user_id)
         db.session.commit()
         flash(f'User {user.full_name} has been banned', 'success')
     
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('main.admin_users'))
 
-@app.route('/admin/unban_user/<int:user_id>')
+@bp.route('/admin/unban_user/<int:user_id>')
 @login_required
 def unban_user(user_id):
     if not current_user.is_admin:
         flash('Access denied', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     user = User.query.get_or_404(user_id)
     if user.is_admin:
@@ -430,14 +482,14 @@ def unban_user(user_id):
         db.session.commit()
         flash(f'User {user.full_name} has been unbanned', 'success')
     
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('main.admin_users'))
 
-@app.route('/admin/message', methods=['GET', 'POST'])
+@bp.route('/admin/message', methods=['GET', 'POST'])
 @login_required
 def admin_message():
     if not current_user.is_admin:
         flash('Access denied', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     form = AdminMessageForm()
     
@@ -447,149 +499,252 @@ def admin_message():
             content=form.content.data,
             created_by=current_user.id
         )
+        # One row for everyone; members' unread counts come from their watermark
         db.session.add(message)
         db.session.commit()
         flash('Platform message sent successfully', 'success')
-        return redirect(url_for('admin'))
+        return redirect(url_for('main.admin'))
     
     return render_template('admin.html', message_form=form, show_message_form=True)
 
-@app.route('/admin/users')
+@bp.route('/admin/users')
+@replica_reads
 @login_required
 def admin_users():
     if not current_user.is_admin:
         flash('Access denied', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
-    users = User.query.filter_by(is_admin=False).order_by(User.created_at.desc()).all()
-    return render_template('admin_users.html', users=users)
+    users, next_cursor = keyset_page(User.query.filter_by(is_admin=False), User.created_at, User.id,
+                                     cursor=request.args.get('cursor'), limit=get_page_size(50))
+    return render_template('admin_users.html', users=users, next_cursor=next_cursor,
+                         bulk_form=BulkUserForm(), report=last_report())
 
-@app.route('/admin/requests')
+@bp.route('/admin/users/bulk', methods=['POST'])
+@login_required
+def admin_bulk_users():
+    if not current_user.is_admin:
+        flash('Access denied', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    form = BulkUserForm()
+    user_ids = [int(user_id) for user_id in request.form.getlist('user_ids') if user_id.isdigit()]
+    if not form.validate_on_submit() or not (user_ids or form.email_like.data):
+        flash('Select users or give an email pattern', 'error')
+        return redirect(url_for('main.admin_users'))
+    
+    # Runs as a background job in batches; progress shows on this page
+    operation = 'ban_users' if form.ban.data else 'unban_users'
+    enqueue('bulk_moderation', operation=operation, user_ids=user_ids, email_like=form.email_like.data or None)
+    db.session.commit()
+    flash(f"{'Ban' if form.ban.data else 'Unban'} queued", 'success')
+    return redirect(url_for('main.admin_users'))
+
+@bp.route('/admin/requests')
+@replica_reads
 @login_required
 def admin_requests():
     if not current_user.is_admin:
         flash('Access denied', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
+    
+    query = SwapRequest.query.options(joinedload(SwapRequest.requester), joinedload(SwapRequest.requested))
+    requests, next_cursor = keyset_page(query, SwapRequest.created_at, SwapRequest.id,
+                                        cursor=request.args.get('cursor'), limit=get_page_size(50))
+    return render_template('admin_requests.html', requests=requests, next_cursor=next_cursor,
+                         cleanup_form=SwapCleanupForm(), report=last_report())
+
+@bp.route('/admin/requests/cleanup', methods=['POST'])
+@login_required
+def admin_cleanup_requests():
+    if not current_user.is_admin:
+        flash('Access denied', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    form = SwapCleanupForm()
+    if not form.validate_on_submit():
+        flash('Choose an action and an age in days', 'error')
+        return redirect(url_for('main.admin_requests'))
+    
+    days = form.older_than_days.data
+    if form.action.data == 'purge':
+        enqueue('bulk_moderation', key=f'cleanup:purge:{days}', operation='purge_swaps', older_than_days=days)
+    elif form.action.data == 'archive':
+        enqueue('bulk_moderation', key=f'cleanup:archive:{days}', operation='archive_swaps', older_than_days=days)
+    else:
+        status = form.action.data.split('_', 1)[1]
+        enqueue('bulk_moderation', key=f'cleanup:cancel:{status}:{days}', operation='cancel_swaps',
+                status=status, older_than_days=days)
+    db.session.commit()
+    flash('Cleanup queued', 'success')
+    return redirect(url_for('main.admin_requests'))
+
+@bp.route('/admin/export/<name>')
+@replica_reads
+@login_required
+def admin_export(name):
+    if not current_user.is_admin:
+        flash('Access denied', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    fmt = request.args.get('format', 'csv')
+    if name not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+    # Streamed straight from a server-side cursor; nothing is built up in memory
+    chunks = export_chunks(name, fmt)
+    filename = f'{name}.{fmt}'
+    mimetype = FORMATS[fmt]
+    if request.args.get('gzip'):
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/admin/perf')
+@login_required
+def admin_perf():
+    if not current_user.is_admin:
+        flash('Access denied', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    recorder = perf.recorder
+    return render_template('admin_perf.html',
+                         enabled=recorder is not None,
+                         endpoints=recorder.summary() if recorder else [],
+                         slowest=recorder.slowest() if recorder else [],
+                         profiles=list(recorder.profiles) if recorder else [])
+
+@bp.route('/admin/perf/profile/<int:profile_id>')
+@login_required
+def admin_perf_profile(profile_id):
+    if not current_user.is_admin:
+        flash('Access denied', 'error')
+        return redirect(url_for('main.dashboard'))
     
-    requests = SwapRequest.query.order_by(SwapRequest.created_at.desc()).all()
-    return render_template('admin_requests.html', requests=requests)
+    profile = perf.recorder.get_profile(profile_id) if perf.recorder else None
+    if profile is None:
+        flash('Profile no longer available', 'info')
+        return redirect(url_for('main.admin_perf'))
+    return Response(profile['stats'], mimetype='text/plain')
+
+@bp.route('/admin/perf/metrics')
+def admin_perf_metrics():
+    # Prometheus text format; scrapers authenticate with PERF_METRICS_TOKEN
+    token = current_app.config['PERF_METRICS_TOKEN']
+    authorized = (current_user.is_authenticated and current_user.is_admin) or \
+        (token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'))
+    if not authorized:
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    if perf.recorder is None:
+        return Response('', status=404, mimetype='text/plain')
+    return Response(perf.recorder.prometheus(), mimetype='text/plain; version=0.0.4')
 
-@app.route('/messages')
+@bp.route('/messages')
 @login_required
 def messages():
-    admin_messages = AdminMessage.query.order_by(AdminMessage.created_at.desc()).all()
-    return render_template('dashboard.html', admin_messages=admin_messages, show_messages=True)
+    cursor = request.args.get('cursor')
+    feed_html, next_cursor = feed_page(cursor=cursor, limit=get_page_size())
+    
+    # Opening the newest page marks everything as seen
+    last_seen_message_id = current_user.last_seen_message_id or 0
+    latest = latest_message_id()
+    if not cursor and latest > last_seen_message_id and mark_messages_seen(current_user, latest):
+        db.session.commit()
+    
+    return render_template('dashboard.html', feed_html=feed_html, next_cursor=next_cursor,
+                         last_seen_message_id=last_seen_message_id, show_messages=True)
+
+def _swaps_stamp(status):
+    # Payloads include the counterpart's profile and feedback left for this user
+    return current_user.version, directory_stamp(), swaps_stamp(current_user.id, status)
 
-@app.route('/api/completed-swaps')
+@bp.route('/api/completed-swaps')
+@replica_reads
 @login_required
+@conditional(partial(_swaps_stamp, 'completed'))
 def api_completed_swaps():
-    completed_swaps = SwapRequest.query.filter(
-        ((SwapRequest.requester_id == current_user.id) | (SwapRequest.requested_id == current_user.id)) &
-        (SwapRequest.status == 'completed')
-    ).order_by(SwapRequest.updated_at.desc()).all()
-    
-    swaps_data = []
-    for swap in completed_swaps:
-        # Determine the other user
-        other_user = swap.requested if swap.requester_id == current_user.id else swap.requester
-        
-        # Get feedback for this swap
-        feedback = Feedback.query.filter_by(
-            swap_request_id=swap.id,
-            to_user_id=current_user.id
-        ).first()
-        
-        swap_data = {
-            'id': swap.id,
-            'skill_offered': swap.skill_offered,
-            'skill_wanted': swap.skill_wanted,
-            'completed_at': swap.updated_at.isoformat(),
-            'other_user': {
-                'id': other_user.id,
-                'full_name': other_user.full_name,
-                'profile_photo': other_user.profile_photo
-            },
-            'feedback': {
-                'rating': feedback.rating,
-                'comment': feedback.comment
-            } if feedback else None
-        }
-        swaps_data.append(swap_data)
-    
-    return jsonify({'swaps': swaps_data})
-
-@app.route('/api/notifications')
+    rows, next_cursor = swap_page(current_user.id, 'completed', SwapRequest.updated_at,
+                                  cursor=request.args.get('cursor'), limit=get_page_size(), with_feedback=True)
+    return jsonify({'swaps': [completed_swap(row) for row in rows], 'next_cursor': next_cursor})
+
+def _matches_stamp():
+    # Served from this worker's match index, which may be older than the directory
+    return directory_stamp(), index_stamp()
+
+@bp.route('/api/matches')
+@replica_reads
+@login_required
+@conditional(_matches_stamp)
+def api_matches():
+    results = find_matches(current_user.id, k=get_page_size())
+    users = db.session.query(User.id, User.first_name, User.last_name, User.profile_photo, User.location).filter(
+        User.id.in_([user_id for _, user_id, _ in results])
+    ).all()
+    users_by_id = {user.id: user for user in users}
+    
+    matches_data = []
+    for score, user_id, details in results:
+        user = users_by_id.get(user_id)
+        if not user:
+            continue
+        matches_data.append({
+            'score': round(score, 3),
+            'reciprocal': details['reciprocal'],
+            'they_offer': details['they_offer'],
+            'they_want': details['they_want'],
+            'user': {
+                'id': user.id,
+                'full_name': f'{user.first_name} {user.last_name}',
+                'profile_photo': user.profile_photo,
+                'location': user.location
+            }
+        })
+    
+    return jsonify({'matches': matches_data})
+
+@bp.route('/api/notifications')
 @login_required
 def api_notifications():
     return jsonify({'unread_count': current_user.unread_notifications or 0})
 
-@app.route('/api/active-swaps')
+@bp.route('/api/notifications/stream')
 @login_required
+def api_notifications_stream():
+    # Server-sent events; the DB session is released before streaming starts
+    stream = event_stream(get_broker(), current_user.id, current_user.unread_notifications or 0,
+                          lifetime=current_app.config['NOTIFICATION_STREAM_LIFETIME'])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/active-swaps')
+@replica_reads
+@login_required
+@conditional(partial(_swaps_stamp, 'accepted'))
 def api_active_swaps():
-    active_swaps = SwapRequest.query.filter(
-        ((SwapRequest.requester_id == current_user.id) | (SwapRequest.requested_id == current_user.id)) &
-        (SwapRequest.status == 'accepted')
-    ).order_by(SwapRequest.updated_at.desc()).all()
-    
-    swaps_data = []
-    for swap in active_swaps:
-        # Determine the other user
-        other_user = swap.requested if swap.requester_id == current_user.id else swap.requester
-        
-        swap_data = {
-            'id': swap.id,
-            'skill_offered': swap.skill_offered,
-            'skill_wanted': swap.skill_wanted,
-            'accepted_at': swap.updated_at.isoformat(),
-            'other_user': {
-                'id': other_user.id,
-                'full_name': other_user.full_name,
-                'profile_photo': other_user.profile_photo,
-                'availability': other_user.availability
-            },
-            'message': swap.message
-        }
-        swaps_data.append(swap_data)
-    
-    return jsonify({'swaps': swaps_data})
-
-@app.route('/api/pending-requests')
+    rows, next_cursor = swap_page(current_user.id, 'accepted', SwapRequest.updated_at,
+                                  cursor=request.args.get('cursor'), limit=get_page_size())
+    return jsonify({'swaps': [active_swap(row) for row in rows], 'next_cursor': next_cursor})
+
+@bp.route('/api/pending-requests')
+@replica_reads
 @login_required
+@conditional(partial(_swaps_stamp, 'pending'))
 def api_pending_requests():
-    pending_requests = SwapRequest.query.filter(
-        ((SwapRequest.requester_id == current_user.id) | (SwapRequest.requested_id == current_user.id)) &
-        (SwapRequest.status == 'pending')
-    ).order_by(SwapRequest.created_at.desc()).all()
-    
-    requests_data = []
-    for request in pending_requests:
-        # Determine if this is sent or received
-        is_sent = request.requester_id == current_user.id
-        other_user = request.requested if is_sent else request.requester
-        
-        request_data = {
-            'id': request.id,
-            'skill_offered': request.skill_offered,
-            'skill_wanted': request.skill_wanted,
-            'created_at': request.created_at.isoformat(),
-            'is_sent': is_sent,
-            'other_user': {
-                'id': other_user.id,
-                'full_name': other_user.full_name,
-                'profile_photo': other_user.profile_photo
-            },
-            'message': request.message
-        }
-        requests_data.append(request_data)
-    
-    return jsonify({'requests': requests_data})
+    rows, next_cursor = swap_page(current_user.id, 'pending', SwapRequest.created_at,
+                                  cursor=request.args.get('cursor'), limit=get_page_size())
+    return jsonify({'requests': [pending_request(row) for row in rows], 'next_cursor': next_cursor})
+
+@bp.route('/media/<variant>/<filename>')
+def media(variant, filename):
+    return send_photo(variant, filename)
 
 # Error handlers
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return render_template('base.html', error='Page not found'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('base.html', error='Internal server error'), 500
\ No newline at end of file
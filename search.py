@@ -0,0 +1,160 @@
+import logging
+import re
+from sqlalchemy import text, Integer, Float
+from sqlalchemy.exc import OperationalError
+from app import db
+from models import User, Skill, SkillWanted
+
+# Full-text index over skill names and categories.
+# SQLite uses external-content FTS5 tables kept in sync by triggers;
+# PostgreSQL uses a GIN expression index over to_tsvector().
+SEARCH_TABLES = (Skill.__tablename__, SkillWanted.__tablename__)
+
+# 'fts5', 'postgres' or None (ILIKE fallback); set by init_search_index() or
+# detected on the first search
+_UNKNOWN = 'unknown'
+_backend = _UNKNOWN
+
+logger = logging.getLogger(__name__)
+
+def _tokenize(search_query):
+    return re.findall(r'\w+', search_query.lower())
+
+def _init_sqlite(conn):
+    for table in SEARCH_TABLES:
+        fts = f'{table}_fts'
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': fts}
+        ).first()
+        if exists:
+            continue
+
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"name, category, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, name, category) VALUES (new.id, new.name, new.category); "
+            f"END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); "
+            f"END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); "
+            f"INSERT INTO {fts}(rowid, name, category) VALUES (new.id, new.name, new.category); "
+            f"END"
+        ))
+        # Index any rows that existed before the FTS table was created
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+def _init_postgres(conn):
+    for table in SEARCH_TABLES:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} "
+            f"USING GIN (to_tsvector('simple', name || ' ' || coalesce(category, '')))"
+        ))
+
+def init_search_index():
+    # Create the search index for the current database backend if missing;
+    # returns the backend in use (None means substring search)
+    global _backend
+    dialect = db.engine.dialect.name
+    try:
+        with db.engine.begin() as conn:
+            if dialect == 'sqlite':
+                _init_sqlite(conn)
+                _backend = 'fts5'
+            elif dialect == 'postgresql':
+                _init_postgres(conn)
+                _backend = 'postgres'
+            else:
+                _backend = None
+    except OperationalError as e:
+        # Only SQLite builds without FTS5 fall back to substring search;
+        # anything else is a real failure
+        if 'no such module: fts5' not in str(e.orig):
+            raise
+        logger.warning('SQLite has no FTS5 module; skill search falls back to ILIKE')
+        _backend = None
+    return _backend
+
+def _detect_backend():
+    # The index is created by `flask init-db`; check once per process that it exists
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        if dialect == 'sqlite':
+            found = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': f'{Skill.__tablename__}_fts'}
+            ).first()
+            return 'fts5' if found else None
+        if dialect == 'postgresql':
+            found = conn.execute(
+                text("SELECT 1 FROM pg_indexes WHERE indexname = :name"),
+                {'name': f'ix_{Skill.__tablename__}_search'}
+            ).first()
+            return 'postgres' if found else None
+    return None
+
+def _ranked_sqlite(tokens):
+    # Every token must match, each as a prefix; name weighs more than category
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    selects = [
+        f"SELECT t.user_id AS user_id, bm25({table}_fts, 10.0, 1.0) AS rank "
+        f"FROM {table}_fts JOIN {table} t ON t.id = {table}_fts.rowid "
+        f"WHERE {table}_fts MATCH :match"
+        for table in SEARCH_TABLES
+    ]
+    sql = f"SELECT user_id, MIN(rank) AS rank FROM ({' UNION ALL '.join(selects)}) GROUP BY user_id"
+    return text(sql).bindparams(match=match)
+
+def _ranked_postgres(tokens):
+    match = ' & '.join(f'{token}:*' for token in tokens)
+    selects = [
+        f"SELECT t.user_id AS user_id, "
+        f"-ts_rank(to_tsvector('simple', t.name || ' ' || coalesce(t.category, '')), to_tsquery('simple', :match)) AS rank "
+        f"FROM {table} t "
+        f"WHERE to_tsvector('simple', t.name || ' ' || coalesce(t.category, '')) @@ to_tsquery('simple', :match)"
+        for table in SEARCH_TABLES
+    ]
+    sql = f"SELECT user_id, MIN(rank) AS rank FROM ({' UNION ALL '.join(selects)}) AS matches GROUP BY user_id"
+    return text(sql).bindparams(match=match)
+
+def _substring_match(query, search_query):
+    # The original ILIKE filter, matching the query literally
+    pattern = '%' + re.sub(r'([\\%_])', r'\\\1', search_query) + '%'
+    skill_users = db.session.query(Skill.user_id).filter(Skill.name.ilike(pattern, escape='\\'))
+    skill_wanted_users = db.session.query(SkillWanted.user_id).filter(SkillWanted.name.ilike(pattern, escape='\\'))
+    return query.filter(User.id.in_(skill_users) | User.id.in_(skill_wanted_users))
+
+def search_users(query, search_query):
+    # Restrict a User query to users with a matching skill. Returns the query
+    # and a rank column (lower is better), or None when results are unranked.
+    if not search_query.strip():
+        return query, None
+    tokens = _tokenize(search_query)
+    if not tokens or re.search(r'[^\w\s]', search_query):
+        # The index only holds words: "++" would match everyone and "c++"
+        # would become the prefix "c", so symbols are matched literally
+        return _substring_match(query, search_query), None
+
+    global _backend
+    if _backend == _UNKNOWN:
+        _backend = _detect_backend()
+
+    if _backend == 'fts5':
+        ranked = _ranked_sqlite(tokens)
+    elif _backend == 'postgres':
+        ranked = _ranked_postgres(tokens)
+    else:
+        return _substring_match(query, search_query), None
+
+    ranked = ranked.columns(user_id=Integer, rank=Float).subquery('skill_matches')
+    return query.join(ranked, ranked.c.user_id == User.id), ranked.c.rank
@@ -0,0 +1,157 @@
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func, text
+from werkzeug.security import generate_password_hash
+from app import db
+from models import User, Skill, SkillWanted, SwapRequest, SwapRequestArchive, Feedback
+from ratings import rebuild_batch
+
+# Synthetic data for load testing. Rows are generated in Python and written
+# with executemany Core inserts in batches, with primary keys assigned up
+# front so later tables can reference earlier ones without reading them
+# back. Every seeded user has the password SEED_PASSWORD.
+SEED_PASSWORD = 'password'
+
+SKILLS = {
+    'design': ['Graphic Design', 'UI Design', 'UX Research', 'Illustration', 'Figma', 'Logo Design'],
+    'development': ['Python', 'JavaScript', 'React', 'SQL', 'Django', 'Flask', 'Rust', 'Go', 'DevOps'],
+    'marketing': ['SEO', 'Content Marketing', 'Social Media', 'Email Marketing', 'Copywriting'],
+    'business': ['Excel', 'Accounting', 'Project Management', 'Public Speaking', 'Negotiation'],
+    'languages': ['Spanish', 'French', 'German', 'Japanese', 'Mandarin', 'Hindi', 'Arabic'],
+    'music': ['Guitar', 'Piano', 'Singing', 'Music Production', 'Drums', 'Violin'],
+    'sports': ['Yoga', 'Running', 'Tennis', 'Swimming', 'Chess', 'Climbing'],
+    'cooking': ['Baking', 'Italian Cooking', 'Vegan Cooking', 'Knife Skills', 'Meal Prep'],
+    'photography': ['Photography', 'Photo Editing', 'Lightroom', 'Video Editing', 'Drone Filming'],
+    'writing': ['Creative Writing', 'Technical Writing', 'Editing', 'Poetry', 'Blogging'],
+}
+FIRST_NAMES = ['Aarav', 'Maya', 'Liam', 'Sofia', 'Noah', 'Priya', 'Ethan', 'Zara', 'Lucas', 'Anika',
+               'Omar', 'Chloe', 'Ravi', 'Emma', 'Kenji', 'Ines', 'Mateo', 'Leah', 'Arjun', 'Nora']
+LAST_NAMES = ['Sharma', 'Garcia', 'Smith', 'Khan', 'Chen', 'Patel', 'Muller', 'Rossi', 'Tanaka', 'Silva',
+              'Brown', 'Nguyen', 'Kumar', 'Lopez', 'Ahmed', 'Cohen', 'Dubois', 'Kim', 'Singh', 'Evans']
+LOCATIONS = ['Mumbai', 'Bengaluru', 'Delhi', 'Pune', 'Ahmedabad', 'London', 'Berlin', 'New York',
+             'Toronto', 'Singapore', 'Sydney', 'Paris', None]
+AVAILABILITY = ['Weekends', 'Evenings', 'Weekday mornings', 'Flexible', None]
+# (status, weight)
+SWAP_STATUSES = [('pending', 30), ('accepted', 20), ('completed', 35), ('declined', 10), ('cancelled', 5)]
+COMMENTS = ['Great teacher!', 'Very patient and clear.', 'Learned a lot.', 'Would swap again.', None]
+
+def _next_id(*models):
+    # Past the highest id in any of the tables (archived swaps keep their ids)
+    return max(db.session.query(func.max(model.id)).scalar() or 0 for model in models) + 1
+
+def _insert(model, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.connection().execute(insert(model.__table__), rows[start:start + batch_size])
+
+def _sync_sequence(model, *others):
+    # Explicit ids leave PostgreSQL sequences behind
+    last_id = _next_id(model, *others) - 1
+    if db.engine.dialect.name == 'postgresql' and last_id:
+        table = model.__tablename__
+        db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), :last_id)"),
+                           {'last_id': last_id})
+
+def seed(users=1000, skills=3000, wanted=3000, swaps=10000, feedback=5000, seed=42,
+         batch_size=10000, progress=None):
+    # Returns {table: rows inserted}
+    rng = random.Random(seed)
+    progress = progress or (lambda message: None)
+    now = datetime.utcnow()
+    catalog = [(name, category) for category, names in SKILLS.items() for name in names]
+    password_hash = generate_password_hash(SEED_PASSWORD)
+
+    first_user = _next_id(User)
+    user_rows = []
+    for i in range(users):
+        user_id = first_user + i
+        row = {
+            'id': user_id,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'email': f'seed{user_id}@example.com',
+            'password_hash': password_hash,
+            'location': rng.choice(LOCATIONS),
+            'availability': rng.choice(AVAILABILITY),
+            'is_public': rng.random() > 0.05,
+            'is_admin': False,
+            'unread_notifications': 0,
+            'rating_sum': 0,
+            'rating_count': 0,
+            'last_seen_message_id': 0,
+            'version': 0,
+            'created_at': now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+        }
+        row['profile_updated_at'] = row['created_at']
+        user_rows.append(row)
+    _insert(User, user_rows, batch_size)
+    progress(f'users: {users}')
+    user_ids = range(first_user, first_user + users)
+
+    for model, count in ((Skill, skills), (SkillWanted, wanted)):
+        rows = []
+        for _ in range(count):
+            name, category = rng.choice(catalog)
+            rows.append({'name': name, 'category': category, 'user_id': rng.choice(user_ids),
+                         'created_at': now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))})
+        _insert(model, rows, batch_size)
+        progress(f'{model.__tablename__}: {count}')
+
+    first_swap = _next_id(SwapRequest, SwapRequestArchive)
+    statuses = [status for status, _ in SWAP_STATUSES]
+    weights = [weight for _, weight in SWAP_STATUSES]
+    swap_rows = []
+    completed = []
+    for i in range(swaps):
+        requester, requested = rng.sample(user_ids, 2)
+        offered, _ = rng.choice(catalog)
+        wanted_skill, _ = rng.choice(catalog)
+        status = rng.choices(statuses, weights)[0]
+        created_at = now - timedelta(seconds=rng.randint(3600, 365 * 24 * 3600))
+        swap_rows.append({
+            'id': first_swap + i,
+            'requester_id': requester,
+            'requested_id': requested,
+            'skill_offered': offered,
+            'skill_wanted': wanted_skill,
+            'status': status,
+            'message': 'Would you like to swap?' if rng.random() < 0.5 else None,
+            'created_at': created_at,
+            'updated_at': created_at if status == 'pending' else
+                created_at + timedelta(seconds=rng.randint(60, 30 * 24 * 3600)),
+        })
+        if status == 'completed':
+            completed.append((first_swap + i, requester, requested))
+        if len(swap_rows) >= batch_size:
+            _insert(SwapRequest, swap_rows, batch_size)
+            swap_rows = []
+    _insert(SwapRequest, swap_rows, batch_size)
+    progress(f'swap_request: {swaps}')
+
+    # Feedback only for completed swaps, at most one per direction
+    feedback_rows = []
+    rated = set()
+    directions = [(swap_id, a, b) for swap_id, a, b in completed] + [(swap_id, b, a) for swap_id, a, b in completed]
+    for swap_id, from_user, to_user in rng.sample(directions, min(feedback, len(directions))):
+        rating = rng.choices([1, 2, 3, 4, 5], [2, 3, 10, 35, 50])[0]
+        feedback_rows.append({'from_user_id': from_user, 'to_user_id': to_user, 'swap_request_id': swap_id,
+                              'rating': rating, 'comment': rng.choice(COMMENTS), 'created_at': now})
+        rated.add(to_user)
+    _insert(Feedback, feedback_rows, batch_size)
+    # Core inserts skip the after_insert listener; rebuild the aggregates in bulk
+    rated = sorted(rated)
+    for start in range(0, len(rated), batch_size):
+        rebuild_batch(db.session.connection(), rated[start:start + batch_size])
+    progress(f'feedback: {len(feedback_rows)}')
+
+    _sync_sequence(User)
+    _sync_sequence(SwapRequest, SwapRequestArchive)
+    db.session.commit()
+
+    # Refresh planner statistics; without them SQLite picks the status index
+    # over the per-user indexes once the swap table is large
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        with db.engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+    progress('analyzed')
+    return {'user': users, 'skill': skills, 'skill_wanted': wanted,
+            'swap_request': swaps, 'feedback': len(feedback_rows)}
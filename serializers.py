@@ -0,0 +1,96 @@
+from sqlalchemy import case, literal, select, union_all
+from sqlalchemy.orm import aliased
+from app import db
+from models import User, SwapRequest, SwapRequestArchive, Feedback, ARCHIVABLE_STATUSES
+from pagination import keyset_page
+
+# JSON serialization for the /api/* swap endpoints. Each page is one query:
+# the counterpart user is joined in and feedback left-joined, selecting only
+# the columns the payloads need, so nothing is lazy-loaded per row. Finished
+# statuses also read swap_request_archive, so archiving doesn't change what
+# a member sees.
+
+def _swap_select(model, user_id, status, with_feedback):
+    other = aliased(User)
+    is_sent = model.requester_id == user_id
+    columns = [
+        model.id,
+        model.skill_offered,
+        model.skill_wanted,
+        model.message,
+        model.created_at,
+        model.updated_at,
+        case((is_sent, True), else_=False).label('is_sent'),
+        other.id.label('other_id'),
+        other.first_name.label('other_first_name'),
+        other.last_name.label('other_last_name'),
+        other.profile_photo.label('other_profile_photo'),
+        other.availability.label('other_availability'),
+    ]
+    if with_feedback:
+        columns += [Feedback.rating.label('feedback_rating'), Feedback.comment.label('feedback_comment')]
+    else:
+        columns += [literal(None).label('feedback_rating'), literal(None).label('feedback_comment')]
+
+    stmt = select(*columns).join(
+        other, other.id == case((is_sent, model.requested_id), else_=model.requester_id)
+    ).where(
+        ((model.requester_id == user_id) | (model.requested_id == user_id)) &
+        (model.status == status)
+    )
+    if with_feedback:
+        stmt = stmt.outerjoin(Feedback, (Feedback.swap_request_id == model.id) &
+                                        (Feedback.to_user_id == user_id))
+    return stmt
+
+def swap_page(user_id, status, order_column, cursor=None, limit=20, with_feedback=False):
+    # order_column is a SwapRequest column; the page is keyed on its name
+    stmt = _swap_select(SwapRequest, user_id, status, with_feedback)
+    if status in ARCHIVABLE_STATUSES:
+        stmt = union_all(stmt, _swap_select(SwapRequestArchive, user_id, status, with_feedback))
+    rows = stmt.subquery()
+    return keyset_page(db.session.query(rows), rows.c[order_column.key], rows.c.id, cursor=cursor, limit=limit)
+
+def _other_user(row, *extra):
+    data = {
+        'id': row.other_id,
+        'full_name': f'{row.other_first_name} {row.other_last_name}',
+        'profile_photo': row.other_profile_photo,
+    }
+    if 'availability' in extra:
+        data['availability'] = row.other_availability
+    return data
+
+def completed_swap(row):
+    return {
+        'id': row.id,
+        'skill_offered': row.skill_offered,
+        'skill_wanted': row.skill_wanted,
+        'completed_at': row.updated_at.isoformat(),
+        'other_user': _other_user(row),
+        'feedback': {
+            'rating': row.feedback_rating,
+            'comment': row.feedback_comment
+        } if row.feedback_rating is not None else None
+    }
+
+def active_swap(row):
+    return {
+        'id': row.id,
+        'skill_offered': row.skill_offered,
+        'skill_wanted': row.skill_wanted,
+        'accepted_at': row.updated_at.isoformat(),
+        'other_user': _other_user(row, 'availability'),
+        'message': row.message
+    }
+
+def pending_request(row):
+    return {
+        'id': row.id,
+        'skill_offered': row.skill_offered,
+        'skill_wanted': row.skill_wanted,
+        'created_at': row.created_at.isoformat(),
+        'is_sent': bool(row.is_sent),
+        'other_user': _other_user(row),
+        'message': row.message
+    }
@@ -0,0 +1,33 @@
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from cache import get_cache
+from models import User, SwapRequest, SwapRequestArchive
+
+# Platform-wide counters for the admin dashboard: one COUNT over users and
+# one GROUP BY status over live and archived swaps each, cached for
+# ADMIN_STATS_TTL seconds.
+ADMIN_STATS_KEY = 'admin:stats'
+
+def admin_stats():
+    cache = get_cache('stats')
+    stats = cache.get(ADMIN_STATS_KEY)
+    if stats is None:
+        by_status = dict(db.session.query(SwapRequest.status, func.count(SwapRequest.id))
+                         .group_by(SwapRequest.status).all())
+        for status, count in db.session.query(SwapRequestArchive.status, func.count(SwapRequestArchive.id)) \
+                .group_by(SwapRequestArchive.status):
+            by_status[status] = by_status.get(status, 0) + count
+        stats = {
+            'total_users': db.session.query(func.count(User.id)).scalar(),
+            'total_swaps': sum(by_status.values()),
+            'active_swaps': by_status.get('accepted', 0),
+            'pending_requests': by_status.get('pending', 0),
+            'completed_swaps': by_status.get('completed', 0),
+            'by_status': by_status,
+        }
+        cache.set(ADMIN_STATS_KEY, stats, ttl=current_app.config['ADMIN_STATS_TTL'])
+    return stats
+
+def invalidate_admin_stats():
+    get_cache('stats').delete(ADMIN_STATS_KEY)
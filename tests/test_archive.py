@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from models import User, SwapRequest, SwapRequestArchive
+from moderation import archive_swaps
+from seeding import seed
+
+def _swap(requester, requested, status, age_days=0):
+    when = datetime.utcnow() - timedelta(days=age_days)
+    swap = SwapRequest(requester_id=requester, requested_id=requested, skill_offered='Python',
+                       skill_wanted='SQL', status=status, created_at=when, updated_at=when)
+    db.session.add(swap)
+    db.session.commit()
+    return swap.id
+
+def _members():
+    seed(users=2, skills=0, wanted=0, swaps=0, feedback=0)
+    return [user.id for user in User.query.filter_by(is_admin=False).order_by(User.id)]
+
+def test_archived_ids_are_never_reused(app):
+    with app.app_context():
+        a, b = _members()
+        archived = [_swap(a, b, 'completed', age_days=365) for _ in range(3)]
+        newest = _swap(a, b, 'pending')
+        assert archive_swaps(older_than_days=30)['rows'] == 3
+
+        # Deleting the newest live row must not free an id for the next swap
+        db.session.delete(db.session.get(SwapRequest, newest))
+        db.session.commit()
+        fresh = _swap(a, b, 'completed', age_days=365)
+        assert fresh > newest
+        assert SwapRequestArchive.find(archived[0]).status == 'completed'
+
+        assert archive_swaps(older_than_days=30)['rows'] == 1
+        assert SwapRequestArchive.query.count() == 4
+        assert SwapRequest.query.count() == 0
+
+def test_id_collision_stops_archiving_without_deleting(app):
+    with app.app_context():
+        a, b = _members()
+        swap_id = _swap(a, b, 'completed', age_days=365)
+        archive_swaps(older_than_days=30)
+        # A live row carrying an archived id, as older databases could have
+        db.session.execute(SwapRequest.__table__.insert().values(
+            id=swap_id, requester_id=a, requested_id=b, skill_offered='Go', skill_wanted='Rust',
+            status='declined', created_at=datetime(2020, 1, 1), updated_at=datetime(2020, 1, 1)))
+        db.session.commit()
+
+        with pytest.raises(RuntimeError, match='already archived'):
+            archive_swaps(older_than_days=30)
+        assert db.session.get(SwapRequest, swap_id).skill_offered == 'Go'
+        assert SwapRequestArchive.query.count() == 1
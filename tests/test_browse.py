@@ -0,0 +1,36 @@
+import pytest
+from app import db
+from cache import get_cache
+from models import User, Skill
+from seeding import seed
+from conftest import QueryCounter, login
+
+def _count_queries(app, client, path):
+    # Warm the per-user caches, then count with a cold fragment cache so
+    # every card on the page is rendered
+    client.get(path)
+    with app.app_context():
+        get_cache('fragments').clear()
+        engine = db.engine
+    with QueryCounter(engine) as counter:
+        response = client.get(path)
+    assert response.status_code == 200
+    assert b'user-card' in response.data
+    return counter.count
+
+@pytest.mark.parametrize('path', ['/browse', '/browse?sort=rating&min_rating=1', '/browse?search_query={skill}'])
+def test_browse_query_count_does_not_grow_with_users(app, path):
+    with app.app_context():
+        seed(users=5, skills=15, wanted=15, swaps=50, feedback=25)
+        member = User.query.filter_by(is_admin=False).order_by(User.id).first()
+        # A skill some other public member offers, so the search has results
+        skill = Skill.query.join(User).filter(User.id != member.id, User.is_public == True) \
+            .order_by(Skill.id).first().name.split()[0]
+        path = path.format(skill=skill)
+    client = login(app.test_client(), member.id)
+    small = _count_queries(app, client, path)
+
+    # Enough users with skills and feedback to fill a whole page
+    with app.app_context():
+        seed(users=100, skills=300, wanted=300, swaps=1000, feedback=500, seed=7)
+    assert _count_queries(app, client, path) == small
@@ -0,0 +1,46 @@
+import pytest
+from models import User
+from seeding import seed
+from conftest import login
+
+@pytest.fixture
+def members(app):
+    with app.app_context():
+        seed(users=2, skills=4, wanted=4, swaps=0, feedback=0)
+        viewer, other = [user for user in User.query.filter_by(is_admin=False).order_by(User.id)]
+        form = {'first_name': other.first_name, 'last_name': other.last_name, 'email': other.email,
+                'location': other.location or '', 'availability': other.availability or '',
+                'is_public': 'y', 'update_profile': 'Update Profile'}
+    return login(app.test_client(), viewer.id), login(app.test_client(), other.id), other.id, form
+
+def _revalidate(client, path, etag):
+    return client.get(path, headers={'If-None-Match': etag})
+
+@pytest.mark.parametrize('path', ['/user/{other}', '/browse'])
+def test_profile_edit_turns_304_into_200(members, path):
+    viewer, other_client, other, form = members
+    path = path.format(other=other)
+    first = viewer.get(path)
+    assert first.status_code == 200 and first.headers['ETag']
+    assert _revalidate(viewer, path, first.headers['ETag']).status_code == 304
+
+    form['first_name'] = 'Renamed'
+    assert other_client.post('/profile', data=form).status_code == 302
+
+    response = _revalidate(viewer, path, first.headers['ETag'])
+    assert response.status_code == 200
+    assert b'Renamed' in response.data
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert _revalidate(viewer, path, response.headers['ETag']).status_code == 304
+
+def test_skill_change_turns_304_into_200(members):
+    viewer, other_client, other, _ = members
+    path = f'/user/{other}'
+    first = viewer.get(path)
+    assert _revalidate(viewer, path, first.headers['ETag']).status_code == 304
+
+    other_client.post('/profile', data={'name': 'Woodworking', 'category': 'design',
+                                        'skill_type': 'offered', 'add_skill': 'Add Skill'})
+    response = _revalidate(viewer, path, first.headers['ETag'])
+    assert response.status_code == 200
+    assert b'Woodworking' in response.data
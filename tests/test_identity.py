@@ -0,0 +1,46 @@
+import pytest
+from app import db
+from cache import MemoryCache, SQLiteCache, get_cache
+from identity import load_identity, _key, _generation_key
+from models import User
+from seeding import seed
+
+def _member(app):
+    with app.app_context():
+        seed(users=1, skills=0, wanted=0, swaps=0, feedback=0)
+        return User.query.filter_by(is_admin=False).first().id
+
+def test_row_cached_by_a_request_that_raced_the_commit_is_ignored(app):
+    member = _member(app)
+    with app.app_context():
+        cache = get_cache('identity')
+        # A request reads the generation and the row before the ban commits
+        generation = cache.get(_generation_key(member))
+        old = {'id': member, 'first_name': 'Old', 'is_public': True}
+        db.session.get(User, member).is_public = False
+        db.session.commit()
+        # ... and caches the old row after the commit dropped the entry
+        cache.set(_key(member), (generation, old))
+        db.session.remove()
+
+        user = load_identity(member)
+        assert user.is_public is False
+        assert user.first_name != 'Old'
+        db.session.remove()
+        # The reloaded row is cached under the new generation and served
+        assert cache.get(_key(member))[0] == cache.get(_generation_key(member))
+        assert load_identity(member).is_public is False
+
+def test_zero_ttl_turns_the_identity_cache_off(app):
+    member = _member(app)
+    app.config['IDENTITY_CACHE_TTL'] = 0
+    with app.app_context():
+        assert load_identity(member).id == member
+        assert get_cache('identity').get(_key(member)) is None
+
+@pytest.mark.parametrize('make_cache', [MemoryCache, lambda: SQLiteCache(':memory:')])
+def test_zero_ttl_stores_nothing(make_cache):
+    cache = make_cache()
+    cache.set('key', 'value')
+    cache.set('key', 'other', ttl=0)
+    assert cache.get('key') is None
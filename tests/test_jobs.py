@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+import pytest
+import jobs
+from app import db
+from jobs import enqueue, claim_next, run_job, work
+from models import Job
+
+@pytest.fixture
+def flaky(monkeypatch):
+    # A handler that fails its first `failures` calls
+    calls = []
+
+    def handler(failures, value):
+        calls.append(value)
+        if len(calls) <= failures:
+            raise RuntimeError(f'attempt {len(calls)} failed')
+    monkeypatch.setitem(jobs.HANDLERS, 'flaky', handler)
+    return calls
+
+def _make_due(job_id):
+    db.session.get(Job, job_id).run_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+def test_same_idempotency_key_is_queued_once(app):
+    with app.app_context():
+        first = enqueue('flaky', key='swap:1', failures=0, value=1)
+        assert first is not None
+        db.session.commit()
+
+        # The duplicate only rolls back its SAVEPOINT, not the transaction
+        assert enqueue('flaky', key='swap:1', failures=0, value=2) is None
+        other = enqueue('flaky', key='swap:2', failures=0, value=3)
+        db.session.commit()
+        assert other.id is not None
+        assert Job.query.filter_by(idempotency_key='swap:1').count() == 1
+
+def test_key_can_be_reused_once_the_job_finished(app, flaky):
+    with app.app_context():
+        enqueue('flaky', key='swap:1', failures=0, value=1)
+        db.session.commit()
+        work(app, once=True)
+        assert enqueue('flaky', key='swap:1', failures=0, value=2) is not None
+        db.session.commit()
+        assert Job.query.filter_by(idempotency_key='swap:1').count() == 2
+
+def test_failed_job_is_retried_with_backoff(app, flaky):
+    app.config.update(JOB_MAX_ATTEMPTS=5, JOB_RETRY_DELAY=10)
+    with app.app_context():
+        job_id = enqueue('flaky', failures=2, value='x').id
+        db.session.commit()
+
+        for attempt, delay in ((1, 10), (2, 20)):
+            started = datetime.utcnow()
+            assert run_job(claim_next()) is False
+            failed = db.session.get(Job, job_id)
+            assert (failed.status, failed.attempts) == ('queued', attempt)
+            assert f'attempt {attempt} failed' in failed.last_error
+            assert started + timedelta(seconds=delay - 1) < failed.run_at < started + timedelta(seconds=delay + 1)
+            # Not due again until the backoff has passed
+            assert claim_next() is None
+            _make_due(job_id)
+
+        assert run_job(claim_next()) is True
+        done = db.session.get(Job, job_id)
+        assert (done.status, done.attempts, done.last_error) == ('done', 3, None)
+        assert done.finished_at is not None
+        assert flaky == ['x', 'x', 'x']
+
+def test_job_fails_after_max_attempts(app, flaky):
+    app.config.update(JOB_MAX_ATTEMPTS=2, JOB_RETRY_DELAY=10)
+    with app.app_context():
+        job_id = enqueue('flaky', failures=99, value='x').id
+        db.session.commit()
+        assert run_job(claim_next()) is False
+        _make_due(job_id)
+        assert run_job(claim_next()) is False
+
+        failed = db.session.get(Job, job_id)
+        assert (failed.status, failed.attempts) == ('failed', 2)
+        assert failed.finished_at is not None
+        assert 'attempt 2 failed' in failed.last_error
+        _make_due(job_id)
+        assert claim_next() is None
+
+def test_unknown_handler_fails_the_job(app):
+    app.config['JOB_MAX_ATTEMPTS'] = 1
+    with app.app_context():
+        job_id = enqueue('no_such_job').id
+        db.session.commit()
+        work(app, once=True)
+        failed = db.session.get(Job, job_id)
+        assert failed.status == 'failed'
+        assert 'No handler registered' in failed.last_error
@@ -0,0 +1,73 @@
+import threading
+import time
+import pytest
+import matching
+from matching import MatchIndex, find_matches
+from models import User
+from seeding import seed
+from conftest import login
+
+@pytest.fixture
+def index(app, monkeypatch):
+    # A fresh per-worker index, built over a small directory
+    index = MatchIndex()
+    monkeypatch.setattr(matching, '_index', index)
+    with app.app_context():
+        seed(users=40, skills=120, wanted=120, swaps=0, feedback=0)
+        member = User.query.filter_by(is_admin=False).order_by(User.id).first().id
+        find_matches(member)
+    return index, member
+
+@pytest.fixture
+def slow_load(monkeypatch):
+    # Rebuilds block until released
+    release = threading.Event()
+    load = MatchIndex._load
+
+    def blocked(self):
+        assert release.wait(10)
+        load(self)
+    monkeypatch.setattr(MatchIndex, '_load', blocked)
+    yield release
+    release.set()
+
+def test_expired_index_is_rebuilt_in_the_background(app, index, slow_load):
+    index, member = index
+    with app.app_context():
+        before = find_matches(member)
+        built_stamp = index.built_stamp
+        index.built_at -= app.config['MATCH_INDEX_TTL'] + 1
+
+        started = time.monotonic()
+        assert find_matches(member) == before
+        assert time.monotonic() - started < 1
+        rebuild = index.rebuilding
+        assert rebuild is not None
+        # Lookups keep being served from the previous index meanwhile
+        assert find_matches(member) == before
+        assert index.rebuilding is rebuild
+
+    slow_load.set()
+    rebuild.join(10)
+    assert index.rebuilding is None
+    assert index.built_stamp != built_stamp
+
+def test_users_changed_during_a_rebuild_stay_stale(app, index, slow_load):
+    index, member = index
+    rebuild = threading.Thread(target=index._rebuild, args=(app,))
+    rebuild.start()
+    while not index.build_lock.locked():
+        time.sleep(0.01)
+    index.mark_stale({member})
+    slow_load.set()
+    rebuild.join(10)
+    assert member in index.stale_users
+
+def test_match_etag_changes_when_the_index_is_rebuilt(app, index):
+    index, member = index
+    client = login(app.test_client(), member)
+    first = client.get('/api/matches')
+    assert client.get('/api/matches', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    with app.app_context():
+        index.build()
+    assert client.get('/api/matches', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
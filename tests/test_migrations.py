@@ -0,0 +1,83 @@
+import sqlite3
+from sqlalchemy import inspect
+import cache
+from app import create_app, db
+from migrations import MIGRATIONS
+from models import User
+
+# The schema the original app created with db.create_all(), before any
+# migration existed
+BASELINE_SCHEMA = '''
+CREATE TABLE user (
+    id INTEGER NOT NULL, first_name VARCHAR(64) NOT NULL, last_name VARCHAR(64) NOT NULL,
+    email VARCHAR(120) NOT NULL, password_hash VARCHAR(256) NOT NULL, location VARCHAR(100),
+    profile_photo VARCHAR(200), availability VARCHAR(200), is_public BOOLEAN, is_admin BOOLEAN,
+    unread_notifications INTEGER, created_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (email)
+);
+CREATE TABLE skill (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, category VARCHAR(50),
+    user_id INTEGER NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE skill_wanted (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, category VARCHAR(50),
+    user_id INTEGER NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE TABLE swap_request (
+    id INTEGER NOT NULL, requester_id INTEGER NOT NULL, requested_id INTEGER NOT NULL,
+    skill_offered VARCHAR(100) NOT NULL, skill_wanted VARCHAR(100) NOT NULL, status VARCHAR(20),
+    message TEXT, created_at DATETIME, updated_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(requester_id) REFERENCES user (id),
+    FOREIGN KEY(requested_id) REFERENCES user (id)
+);
+CREATE TABLE admin_message (
+    id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, content TEXT NOT NULL,
+    created_at DATETIME, created_by INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(created_by) REFERENCES user (id)
+);
+CREATE TABLE feedback (
+    id INTEGER NOT NULL, from_user_id INTEGER NOT NULL, to_user_id INTEGER NOT NULL,
+    swap_request_id INTEGER NOT NULL, rating INTEGER NOT NULL, comment TEXT, created_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(from_user_id) REFERENCES user (id),
+    FOREIGN KEY(to_user_id) REFERENCES user (id), FOREIGN KEY(swap_request_id) REFERENCES swap_request (id)
+);
+INSERT INTO user (id, first_name, last_name, email, password_hash, is_public, is_admin, unread_notifications, created_at)
+VALUES (1, 'Ada', 'Lovelace', 'ada@example.com', 'x', 1, 0, 0, '2024-01-01 00:00:00'),
+       (2, 'Alan', 'Turing', 'alan@example.com', 'x', 1, 0, 0, '2024-01-02 00:00:00');
+INSERT INTO swap_request (id, requester_id, requested_id, skill_offered, skill_wanted, status, created_at, updated_at)
+VALUES (1, 1, 2, 'Python', 'SQL', 'completed', '2024-02-01 00:00:00', '2024-02-02 00:00:00');
+INSERT INTO feedback (id, from_user_id, to_user_id, swap_request_id, rating, created_at)
+VALUES (1, 1, 2, 1, 4, '2024-02-03 00:00:00');
+INSERT INTO admin_message (id, title, content, created_at, created_by)
+VALUES (1, 'Welcome', 'Hello', '2024-01-03 00:00:00', 1);
+'''
+
+def test_baseline_database_upgrades(tmp_path):
+    path = tmp_path / 'baseline.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    cache._caches.clear()
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+                      'JOB_RUNNER': 'external', 'PERF_ENABLED': False})
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    for _, name, _ in MIGRATIONS:
+        assert f'Applied {name}' in result.output
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        # Every index the models declare exists once the upgrade is done
+        for table in db.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            assert {index.name for index in table.indexes} <= existing, table.name
+        alan = db.session.get(User, 2)
+        assert (alan.rating_count, alan.rating_4, alan.rating_avg) == (1, 1, 4.0)
+        assert alan.profile_updated_at is not None
+        assert alan.last_seen_message_id == 1
+        db.engine.dispose()
+
+    result = app.test_cli_runner().invoke(args=['upgrade-db'])
+    assert 'Schema is up to date' in result.output
+    cache._caches.clear()
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import pytest
+from app import db
+from asgi import create_asgi_app
+from notifications import MemoryBroker, LocalSocketBroker, RedisBroker, async_event_stream, event_stream
+from models import User, SwapRequest
+from seeding import seed
+from conftest import login
+
+SENDERS = 20
+
+def test_parallel_swap_requests_lose_no_increments(app):
+    with app.app_context():
+        seed(users=SENDERS + 1, skills=0, wanted=0, swaps=0, feedback=0)
+        target, *senders = [user.id for user in User.query.filter_by(is_admin=False).order_by(User.id)]
+        User.query.filter_by(id=target).update({'unread_notifications': 0})
+        db.session.commit()
+
+    # Every sender posts at the same moment from its own thread and client
+    barrier = threading.Barrier(len(senders))
+    statuses = []
+    def send(sender):
+        client = login(app.test_client(), sender)
+        barrier.wait()
+        response = client.post(f'/send_request/{target}',
+                               data={'skill_offered': 'Python', 'skill_wanted': 'SQL'})
+        statuses.append(response.status_code)
+    threads = [threading.Thread(target=send, args=(sender,)) for sender in senders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [302] * len(senders)
+    with app.app_context():
+        assert SwapRequest.query.filter_by(requested_id=target).count() == len(senders)
+        assert db.session.get(User, target).unread_notifications == len(senders)
+
+@pytest.fixture(params=['memory', 'local', 'redis'])
+def broker(request, tmp_path, monkeypatch):
+    if request.param == 'memory':
+        return MemoryBroker()
+    if request.param == 'local':
+        return LocalSocketBroker(str(tmp_path))
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', staticmethod(lambda url: fakeredis.FakeRedis(server=server)))
+    return RedisBroker('redis://localhost')
+
+def test_event_stream_delivers(broker):
+    stream = event_stream(broker, 1, 0, lifetime=5, heartbeat=1)
+    assert next(stream) == 'retry: 5000\n'
+    assert next(stream) == 'data: {"unread_count": 0}\n\n'
+    time.sleep(0.2)  # listener threads subscribe asynchronously
+    broker.publish(1, {'unread_count': 3})
+    assert next(stream) == 'data: {"unread_count": 3}\n\n'
+    stream.close()
+    assert not broker._subscribers
+
+def test_async_event_stream_delivers(broker):
+    async def run():
+        stream = async_event_stream(broker, 1, 0, lifetime=5, heartbeat=1)
+        await stream.__anext__()
+        await stream.__anext__()
+        await asyncio.sleep(0.2)
+        broker.publish(1, {'unread_count': 4})
+        event = await asyncio.wait_for(stream.__anext__(), 2)
+        await stream.aclose()
+        return event
+    assert asyncio.run(run()) == 'data: {"unread_count": 4}\n\n'
+    assert not broker._subscribers
+
+def test_pages_poll_unless_push_is_enabled(app):
+    with app.app_context():
+        seed(users=1, skills=0, wanted=0, swaps=0, feedback=0)
+        member = User.query.filter_by(is_admin=False).first().id
+    client = login(app.test_client(), member)
+    assert b'if (!false || !window.EventSource)' in client.get('/dashboard').data
+    create_asgi_app(app)
+    assert b'if (!true || !window.EventSource)' in client.get('/dashboard').data
@@ -0,0 +1,51 @@
+import base64
+import json
+import re
+import pytest
+from models import User
+from seeding import seed
+from conftest import login
+
+def _listed(response):
+    # The users or swaps a page lists, in order
+    if response.is_json:
+        return response.get_json()['requests']
+    return re.findall(r'href="(/user/\d+)"', response.get_data(as_text=True))
+
+def _token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+TAMPERED = [
+    _token({'k': [1], 'id': 1}),
+    _token({'k': {'a': 1}, 'id': 1}),
+    _token({'k': '2030-01-01', 'id': 1}),
+    _token({'k': True, 'id': 1}),
+    _token({'t': 'yesterday', 'id': 1}),
+    _token({'t': 20300101, 'id': 1}),
+    _token({'t': '2030-01-01T00:00:00', 'k': 5.0, 'id': [1]}),
+    _token({'t': '2030-01-01T00:00:00', 'k': 5.0, 'id': '1'}),
+    _token([1, 2]),
+    'not a cursor',
+]
+
+@pytest.fixture
+def member_client(app):
+    with app.app_context():
+        seed(users=30, skills=60, wanted=60, swaps=600, feedback=200)
+        member = User.query.filter_by(is_admin=False).order_by(User.id).first().id
+    return login(app.test_client(), member)
+
+@pytest.mark.parametrize('path', ['/browse?limit=5', '/browse?sort=rating&limit=5', '/api/pending-requests?limit=2'])
+@pytest.mark.parametrize('cursor', TAMPERED)
+def test_tampered_cursor_restarts_from_the_first_page(member_client, path, cursor):
+    first = member_client.get(path)
+    assert first.status_code == 200 and _listed(first)
+    response = member_client.get(f'{path}&cursor={cursor}')
+    assert response.status_code == 200
+    assert _listed(response) == _listed(first)
+
+def test_next_cursor_moves_past_the_first_page(member_client):
+    first = member_client.get('/api/pending-requests?limit=1').get_json()
+    assert first['next_cursor']
+    second = member_client.get(f"/api/pending-requests?limit=1&cursor={first['next_cursor']}").get_json()
+    assert second['requests'] and second['requests'] != first['requests']
@@ -0,0 +1,39 @@
+import re
+import pytest
+from app import db
+from models import User, Skill
+from conftest import login
+
+def _member(email, skill):
+    user = User(first_name=skill, last_name='Dev', email=email, password_hash='x', is_public=True)
+    user.skills_offered.append(Skill(name=skill, category='programming'))
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+@pytest.fixture
+def members(app):
+    with app.app_context():
+        admin = User.query.filter_by(is_admin=True).first().id
+        ids = {skill: _member(f'{skill.lower()}@example.com', skill) for skill in ('C++', 'C', 'Python', 'Cobol')}
+    return login(app.test_client(), admin), ids
+
+def _found(client, search_query):
+    response = client.get('/browse', query_string={'search_query': search_query})
+    assert response.status_code == 200
+    return {int(user_id) for user_id in re.findall(r'href="/user/(\d+)"', response.get_data(as_text=True))}
+
+@pytest.mark.parametrize('search_query', ['++', '"', '-', '%', '_'])
+def test_symbol_only_queries_do_not_list_everyone(members, search_query):
+    client, ids = members
+    found = _found(client, search_query)
+    assert found == ({ids['C++']} if search_query == '++' else set())
+
+def test_symbols_are_matched_literally(members):
+    client, ids = members
+    assert _found(client, 'c++') == {ids['C++']}
+
+def test_words_use_the_prefix_index(members):
+    client, ids = members
+    assert _found(client, 'pyth') == {ids['Python']}
+    assert _found(client, 'c') == {ids['C++'], ids['C'], ids['Cobol']}